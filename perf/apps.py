@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+from django.core import checks
+
+
+class PerfConfig(AppConfig):
+    name = 'perf'
+
+    def ready(self):
+        from . import templates
+        checks.register(templates.check_templates, checks.Tags.templates)
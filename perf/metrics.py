@@ -0,0 +1,141 @@
+"""
+Замеры одного запроса и их агрегаты внутри процесса.
+
+RequestStats текущего запроса лежит в contextvar current: его пополняют
+обёртка выполнения SQL (middleware), шаблонный бэкенд perf.templates
+и posts.caching.get_or_compute. По завершении запроса замеры попадают
+в гистограммы по имени представления, которые отдаёт /metrics/
+в формате Prometheus. У каждого воркера свои гистограммы: Prometheus
+собирает их с каждого процесса отдельно.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+current = ContextVar('perf_request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_queries += 1
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} q"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+            f'total;dur={self.duration * 1000:.1f}',
+        ])
+
+
+def count_cache_lookup(hit, kind='fragment'):
+    stats = current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+    with _lock:
+        _cache_lookups[kind, 'hit' if hit else 'miss'] += 1
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+METRICS = (
+    ('yatube_request_duration_seconds', 'Время обработки запроса.',
+     SECONDS_BUCKETS, lambda stats: stats.duration),
+    ('yatube_request_db_queries', 'Число SQL-запросов за запрос.',
+     QUERY_BUCKETS, lambda stats: stats.db_queries),
+    ('yatube_request_db_seconds', 'Время SQL-запросов за запрос.',
+     SECONDS_BUCKETS, lambda stats: stats.db_time),
+    ('yatube_request_template_seconds', 'Время рендера шаблонов за запрос.',
+     SECONDS_BUCKETS, lambda stats: stats.template_time),
+)
+
+_lock = threading.Lock()
+_histograms = {name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+               for name, _, buckets, _ in METRICS}
+_cache_lookups = defaultdict(int)
+
+
+def observe(view, stats):
+    with _lock:
+        for name, _, _, value in METRICS:
+            _histograms[name][view].observe(value(stats))
+
+
+def reset():
+    with _lock:
+        for histograms in _histograms.values():
+            histograms.clear()
+        _cache_lookups.clear()
+
+
+def _label(value):
+    value = str(value).replace('\\', r'\\').replace('"', r'\"')
+    return value.replace('\n', r'\n')
+
+
+def render():
+    lines = []
+    with _lock:
+        for name, help_text, _, _ in METRICS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for view, histogram in sorted(_histograms[name].items()):
+                view = _label(view)
+                for bound, total in histogram.cumulative():
+                    lines.append(
+                        f'{name}_bucket{{view="{view}",le="{bound}"}} {total}'
+                    )
+                lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+                lines.append(
+                    f'{name}_count{{view="{view}"}} {histogram.count}'
+                )
+        lines.append('# HELP yatube_cache_lookups_total '
+                     'Обращения к кэшу фрагментов и страниц.')
+        lines.append('# TYPE yatube_cache_lookups_total counter')
+        for (kind, result), count in sorted(_cache_lookups.items()):
+            lines.append(f'yatube_cache_lookups_total'
+                         f'{{cache="{kind}",result="{result}"}} {count}')
+    return '\n'.join(lines) + '\n'
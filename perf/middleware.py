@@ -0,0 +1,76 @@
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .querylog import QueryLog
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет время запроса, SQL, рендер шаблонов и обращения к кэшу
+    и копит гистограммы для /metrics/; с PERF_SERVER_TIMING добавляет
+    заголовок Server-Timing. Доля PERF_QUERY_LOG_SAMPLE_RATE запросов
+    дополнительно проверяется на повторы и медленный SQL (perf.querylog).
+    У потокового ответа тело рендерится уже после middleware, поэтому
+    замеры продолжаются, пока клиент читает тело, и записываются, когда
+    оно закрыто. Должен стоять первым в MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.RequestStats()
+        wrappers = [stats.execute_wrapper]
+        query_log = None
+        if random.random() < settings.PERF_QUERY_LOG_SAMPLE_RATE:
+            query_log = QueryLog()
+            wrappers.append(query_log.execute_wrapper)
+        response = measure(stats, wrappers, self.get_response, request)
+        stats.finish()
+        if settings.PERF_SERVER_TIMING:
+            # У потокового ответа — только то, что сделано до заголовков.
+            response['Server-Timing'] = stats.server_timing()
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, response, stats,
+                wrappers, query_log,
+            )
+        else:
+            self.record(request, response, stats, query_log)
+        return response
+
+    def stream(self, content, request, response, stats, wrappers,
+               query_log):
+        chunks = iter(content)
+        try:
+            while True:
+                chunk = measure(stats, wrappers, next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            stats.finish()
+            self.record(request, response, stats, query_log)
+
+    def record(self, request, response, stats, query_log):
+        if query_log is not None:
+            query_log.write(request, response, stats)
+        match = getattr(request, 'resolver_match', None)
+        metrics.observe(match.view_name if match else 'unresolved', stats)
+
+
+def measure(stats, wrappers, func, *args):
+    """func(*args) с замерами SQL и шаблонов в stats."""
+    token = metrics.current.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                for wrapper in wrappers:
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+            return func(*args)
+    finally:
+        metrics.current.reset(token)
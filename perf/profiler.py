@@ -0,0 +1,122 @@
+"""
+Статистический профилировщик для работающего процесса.
+
+Фоновый поток через равные промежутки снимает стеки всех остальных потоков
+(sys._current_frames) и считает одинаковые стеки. Результат — «свёрнутые»
+стеки в формате flamegraph.pl/speedscope: «поток;функция;...;функция N».
+
+Снятие стека держит GIL и тормозит остальные потоки, поэтому время самих
+замеров учитывается: если оно превышает долю max_overhead от интервала,
+интервал увеличивается. Одновременно в процессе работает один сеанс.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_session = None
+
+
+class Profiler:
+    def __init__(self, seconds, interval=0.01, max_overhead=0.02):
+        self.seconds = seconds
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.counts = Counter()
+        self.samples = 0
+        self.sampling_time = 0.0
+        self.started = None
+        self.finished = None
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='perf-profiler')
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def overhead(self):
+        """Доля времени, потраченная на снятие стеков."""
+        return self.sampling_time / self.elapsed if self.started else 0.0
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        interval = self.interval
+        deadline = self.started + self.seconds
+        while not self._stop.wait(interval):
+            started = time.perf_counter()
+            self.sample()
+            cost = time.perf_counter() - started
+            self.sampling_time += cost
+            interval = max(self.interval, cost / self.max_overhead)
+            if time.monotonic() >= deadline:
+                break
+        self.finished = time.monotonic()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            path = code.co_filename
+            if path.startswith(settings.BASE_DIR):
+                path = os.path.relpath(path, settings.BASE_DIR)
+            else:
+                path = os.path.basename(path)
+            label = f'{code.co_name} ({path}:{code.co_firstlineno})'
+            self._labels[code] = label
+        return label
+
+    def sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name
+                 for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.counts[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.counts.most_common())
+
+
+def start(seconds, interval=None):
+    """Запускает сеанс или возвращает None, если другой ещё идёт."""
+    global _session
+    seconds = min(seconds, settings.PERF_PROFILER_MAX_SECONDS)
+    with _lock:
+        if _session is not None and _session.running:
+            return None
+        _session = Profiler(
+            seconds,
+            interval=max(interval or settings.PERF_PROFILER_INTERVAL, 0.001),
+            max_overhead=settings.PERF_PROFILER_MAX_OVERHEAD,
+        ).start()
+        return _session
+
+
+def last_session():
+    return _session
@@ -0,0 +1,159 @@
+"""
+Журнал повторяющихся и медленных SQL-запросов.
+
+Для доли запросов PERF_QUERY_LOG_SAMPLE_RATE middleware записывает каждый
+SQL-запрос с отпечатком нормализованного текста (литералы и списки IN
+заменены на ?). Если один отпечаток встретился больше
+PERF_DUPLICATE_QUERY_THRESHOLD раз (типичный N+1) или запрос шёл дольше
+PERF_SLOW_QUERY_MS, в логгер perf.queries уходит строка JSON с
+представлением, шаблоном и строкой шаблона, из которых выполнен запрос,
+и несколькими кадрами стека кода проекта.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger('perf.queries')
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+STACK_DEPTH = 5
+SQL_PREVIEW = 500
+# Кадры самих замеров в стеке не нужны.
+INSTRUMENTATION = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('querylog.py', 'middleware.py', 'templates.py')
+}
+
+
+def normalize(sql):
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def template_origin(frame):
+    """«шаблон:строка» ближайшего рендерящегося тега или None."""
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None:
+                name = origin.template_name or origin.name
+                return f'{name}:{getattr(token, "lineno", "?")}'
+        frame = frame.f_back
+    return None
+
+
+def project_stack(frame):
+    """Последние кадры стека из кода проекта, без библиотек и замеров."""
+    base = settings.BASE_DIR + os.sep
+    stack = []
+    while frame is not None and len(stack) < STACK_DEPTH:
+        path = frame.f_code.co_filename
+        if (path.startswith(base) and path not in INSTRUMENTATION
+                and 'site-packages' not in path):
+            stack.append(f'{os.path.relpath(path, base)}:{frame.f_lineno} '
+                         f'in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return stack
+
+
+class QueryLogFileHandler(logging.FileHandler):
+    """Файл журнала открывается и создаётся только при первой записи."""
+
+    def __init__(self, filename, **kwargs):
+        kwargs.setdefault('encoding', 'utf-8')
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class QueryLog:
+    """Запросы одного выбранного для журнала HTTP-запроса."""
+
+    def __init__(self):
+        self.queries = OrderedDict()
+        self.slow = []
+        self.slow_seconds = settings.PERF_SLOW_QUERY_MS / 1000
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - started)
+
+    def record(self, sql, duration):
+        normalized = normalize(sql)
+        key = fingerprint(normalized)
+        entry = self.queries.get(key)
+        is_slow = duration >= self.slow_seconds
+        if entry is None or is_slow:
+            frame = sys._getframe(2)
+            where = {'template': template_origin(frame),
+                     'stack': project_stack(frame)}
+        if entry is None:
+            entry = self.queries[key] = {
+                'fingerprint': key,
+                'sql': normalized[:SQL_PREVIEW],
+                'count': 0,
+                'total_ms': 0.0,
+                **where,
+            }
+        entry['count'] += 1
+        entry['total_ms'] += duration * 1000
+        if is_slow:
+            self.slow.append({'fingerprint': key,
+                              'sql': normalized[:SQL_PREVIEW],
+                              'ms': round(duration * 1000, 2),
+                              **where})
+
+    def duplicates(self):
+        threshold = settings.PERF_DUPLICATE_QUERY_THRESHOLD
+        return [dict(entry, total_ms=round(entry['total_ms'], 2))
+                for entry in self.queries.values()
+                if entry['count'] > threshold]
+
+    def report(self, request, response, stats):
+        """Словарь для журнала или None, если нарушений нет."""
+        duplicates = self.duplicates()
+        if not duplicates and not self.slow:
+            return None
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(stats.duration * 1000, 2),
+            'queries': stats.db_queries,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'duplicates': duplicates,
+            'slow': self.slow,
+        }
+
+    def write(self, request, response, stats):
+        record = self.report(request, response, stats)
+        if record is not None:
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        return record
@@ -0,0 +1,242 @@
+"""
+Шаблонный бэкенд, который засекает время рендера для perf.metrics.
+
+Вложенные рендеры (шаблоны, которые рендерят теги) не суммируются
+повторно: учитывается только внешний вызов.
+
+preload() при старте воркера компилирует все шаблоны в кэш загрузчика
+и может встроить {% include %} внутри циклов; check_templates —
+системная проверка целей {% include %} и {% extends %}.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import checks
+from django.template import Engine, TemplateDoesNotExist, TemplateSyntaxError
+from django.template.backends.django import DjangoTemplates, Template
+from django.template.defaulttags import ForNode
+from django.template.loader_tags import ExtendsNode, IncludeNode
+
+from . import metrics
+
+
+@contextmanager
+def timed():
+    """
+    Засчитывает время блока в рендер шаблонов текущего запроса. Нужен
+    и рендеру в обход Template.render, например отложенным карточкам
+    posts.streaming.
+    """
+    stats = metrics.current.get()
+    if stats is None:
+        yield
+        return
+    stats.template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.template_depth -= 1
+        if not stats.template_depth:
+            stats.template_time += time.perf_counter() - started
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+# Предзагрузка и проверка шаблонов.
+
+TEMPLATE_SUFFIXES = ('.html', '.txt', '.xml')
+
+
+def _leaf_loaders(loaders):
+    for loader in loaders:
+        # cached.Loader оборачивает настоящие загрузчики.
+        inner = getattr(loader, 'loaders', None)
+        if inner is None:
+            yield loader
+        else:
+            yield from _leaf_loaders(inner)
+
+
+def template_names(engine, root=None):
+    """Имена всех шаблонов в каталогах загрузчиков (только внутри root)."""
+    names = set()
+    for loader in _leaf_loaders(engine.template_loaders):
+        for directory in loader.get_dirs():
+            directory = str(directory)
+            if root is not None and not directory.startswith(str(root)):
+                continue
+            for path, _, files in os.walk(directory):
+                for name in files:
+                    if name.endswith(TEMPLATE_SUFFIXES):
+                        relative = os.path.relpath(os.path.join(path, name),
+                                                   directory)
+                        names.add(relative.replace(os.sep, '/'))
+    return sorted(names)
+
+
+def _constant(expression):
+    """Имя шаблона, если оно задано строкой без фильтров, иначе None."""
+    if expression.filters or not isinstance(expression.var, str):
+        return None
+    return str(expression.var)
+
+
+def missing_targets(engine, template):
+    """Постоянные цели {% include %} и {% extends %}, которых нет."""
+    nodelist = template.nodelist
+    expressions = (
+        [node.template for node in nodelist.get_nodes_by_type(IncludeNode)]
+        + [node.parent_name
+           for node in nodelist.get_nodes_by_type(ExtendsNode)]
+    )
+    missing = []
+    for expression in expressions:
+        name = _constant(expression)
+        if name is None:
+            continue
+        try:
+            engine.get_template(name)
+        except TemplateDoesNotExist:
+            missing.append(name)
+    return missing
+
+
+class InlinedIncludeNode(IncludeNode):
+    """
+    {% include %} с уже загруженным шаблоном: не разрешает имя и не ищет
+    шаблон на каждой итерации цикла.
+    """
+
+    def __init__(self, node, included):
+        super().__init__(node.template, extra_context=node.extra_context,
+                         isolated_context=node.isolated_context)
+        self.token = node.token
+        self.origin = node.origin
+        self.included = included
+
+    def render(self, context):
+        values = {name: var.resolve(context)
+                  for name, var in self.extra_context.items()}
+        if self.isolated_context:
+            context = context.new(values)
+            values = {}
+        # Состояние {% cycle %} и блоков у включения своё, как у include.
+        with context.render_context.push_state(self.included), \
+                context.push(**values):
+            return self.included._render(context)
+
+
+def inline_includes(engine, template):
+    """
+    Заменяет {% include %} с постоянным именем внутри {% for %} (и его
+    подклассов) на InlinedIncludeNode. Шаблоны с {% extends %}
+    не встраиваются. Возвращает число замен.
+    """
+    count = 0
+
+    def walk(nodelist, in_loop):
+        nonlocal count
+        for index, node in enumerate(nodelist):
+            if in_loop and type(node) is IncludeNode:
+                included = _static_include(engine, node)
+                if included is not None:
+                    nodelist[index] = InlinedIncludeNode(node, included)
+                    count += 1
+                    # Включения внутри встроенного шаблона тоже в цикле.
+                    walk(included.nodelist, True)
+                continue
+            for attr in node.child_nodelists:
+                child = getattr(node, attr, None)
+                if child:
+                    walk(child, in_loop or (isinstance(node, ForNode)
+                                            and attr == 'nodelist_loop'))
+
+    walk(template.nodelist, False)
+    return count
+
+
+def _static_include(engine, node):
+    name = _constant(node.template)
+    if name is None:
+        return None
+    try:
+        included = engine.get_template(name)
+    except TemplateDoesNotExist:
+        return None
+    if included.nodelist.get_nodes_by_type(ExtendsNode):
+        return None
+    return included
+
+
+def preload(inline=None):
+    """
+    Компилирует все шаблоны в кэш cached.Loader, чтобы первые запросы
+    воркера не разбирали их сами; с inline (по умолчанию
+    TEMPLATE_INLINE_INCLUDES) встраивает включения в циклах. Возвращает
+    (число шаблонов, [(шаблон, ошибка)]).
+    """
+    if inline is None:
+        inline = settings.TEMPLATE_INLINE_INCLUDES
+    engine = Engine.get_default()
+    # Виджеты contrib подключают шаблоны рендерера форм, а не этого
+    # движка, поэтому цели проверяются только у шаблонов проекта.
+    project = set(template_names(engine, root=settings.BASE_DIR))
+    loaded, errors = 0, []
+    for name in template_names(engine):
+        try:
+            template = engine.get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+            errors.append((name, exc))
+            continue
+        if name in project:
+            for target in missing_targets(engine, template):
+                errors.append((name, TemplateDoesNotExist(target)))
+        if inline:
+            inline_includes(engine, template)
+        loaded += 1
+    return loaded, errors
+
+
+def reset():
+    """Очищает кэш скомпилированных шаблонов."""
+    for loader in Engine.get_default().template_loaders:
+        loader.reset()
+
+
+def check_templates(app_configs, **kwargs):
+    """
+    Системная проверка: шаблоны проекта компилируются, а постоянные цели
+    их {% include %} и {% extends %} существуют.
+    """
+    engine = Engine.get_default()
+    problems = []
+    for name in template_names(engine, root=settings.BASE_DIR):
+        try:
+            template = engine.get_template(name)
+        except TemplateSyntaxError as exc:
+            problems.append(checks.Error(
+                f'Шаблон {name} не компилируется: {exc}', id='perf.E001',
+            ))
+            continue
+        for target in missing_targets(engine, template):
+            problems.append(checks.Error(
+                f'Шаблон {name} подключает несуществующий {target}',
+                id='perf.E002',
+            ))
+    return problems
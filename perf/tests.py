@@ -0,0 +1,250 @@
+import json
+import re
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Engine, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+
+from perf import metrics, profiler, querylog, templates
+
+SERVER_TIMING_RE = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) q", tpl;dur=([\d.]+), '
+    r'cache;desc="hit=(\d+) miss=(\d+)", total;dur=[\d.]+'
+)
+
+
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.staff = User.objects.create_user(username='Admin',
+                                              is_staff=True)
+
+    def server_timing(self, url):
+        response = self.client.get(url)
+        match = SERVER_TIMING_RE.fullmatch(response['Server-Timing'])
+        self.assertIsNotNone(match, response['Server-Timing'])
+        queries, template_ms, hits, misses = match.groups()
+        return int(queries), float(template_ms), int(hits), int(misses)
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_server_timing(self):
+        queries, template_ms, hits, misses = self.server_timing(
+            reverse('index'))
+        self.assertGreater(queries, 0)
+        self.assertGreater(template_ms, 0)
+        self.assertEqual((hits, misses), (0, 1))
+
+        _, _, hits, misses = self.server_timing(reverse('index'))
+        self.assertEqual((hits, misses), (1, 0))
+
+    def test_server_timing_is_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('index')))
+
+    @override_settings(STREAMING_FEEDS=True, PERF_SERVER_TIMING=True)
+    def test_streaming_response_is_recorded_when_closed(self):
+        author = User.objects.create_user(username='Streamer')
+        Post.objects.create(text='Карточка', author=author)
+        response = self.client.get(reverse('profile', args=['Streamer']))
+        self.assertTrue(response.streaming)
+        self.assertNotIn('view="profile"', metrics.render())
+        header_ms = float(SERVER_TIMING_RE.fullmatch(
+            response['Server-Timing']).group(2))
+
+        with mock.patch.object(metrics, 'observe') as observe:
+            content = b''.join(response.streaming_content)
+        self.assertIn('Карточка', content.decode())
+        view, stats = observe.call_args[0]
+        self.assertEqual(view, 'profile')
+        # Карточки рендерятся при чтении тела, после заголовков.
+        self.assertGreater(stats.template_time * 1000, header_ms)
+
+    def test_metrics_are_staff_only(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code,
+                         403)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      body)
+        self.assertIn('yatube_request_duration_seconds_bucket'
+                      '{view="index",le="+Inf"} 1', body)
+        self.assertIn('yatube_request_db_queries_count{view="index"} 1', body)
+        self.assertIn('yatube_cache_lookups_total'
+                      '{cache="fragment",result="miss"} 1', body)
+
+    @override_settings(PERF_METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram((1, 5))
+        for value in (0, 1, 3, 7):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative()),
+                         [(1, 2), (5, 3), ('+Inf', 4)])
+        self.assertEqual(histogram.sum, 11)
+
+
+class QueryLogTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='Writer')
+        for i in range(8):
+            Post.objects.create(text=f'пост {i}', author=author)
+
+    def test_normalize(self):
+        self.assertEqual(
+            querylog.normalize(
+                "SELECT *  FROM t WHERE a = 'x''y' AND b IN (1, 2, 3)\n"
+                "AND c = %s"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) AND c = %s',
+        )
+
+    @override_settings(PERF_QUERY_LOG_SAMPLE_RATE=1,
+                       PERF_DUPLICATE_QUERY_THRESHOLD=5,
+                       PERF_SLOW_QUERY_MS=10 ** 6)
+    def test_duplicate_queries_are_logged(self):
+        # N+1 в шаблоне: автор каждого поста загружается отдельно.
+        template = Template('{% for post in posts %}'
+                            '{{ post.author.username }}{% endfor %}')
+        with self.assertLogs('perf.queries', 'WARNING') as logs:
+            log = querylog.QueryLog()
+            with connection.execute_wrapper(log.execute_wrapper):
+                template.render(Context({'posts': Post.objects.all()}))
+            log.write(RequestFactory().get('/'), HttpResponse(),
+                      metrics.RequestStats())
+        record = json.loads(logs.records[0].getMessage())
+        duplicate, = record['duplicates']
+        self.assertEqual(duplicate['count'], 8)
+        self.assertIn('FROM "auth_user"', duplicate['sql'])
+        self.assertEqual(duplicate['template'], '<unknown source>:1')
+        self.assertTrue(duplicate['stack'][0].startswith('perf/tests.py'))
+
+    @override_settings(PERF_QUERY_LOG_SAMPLE_RATE=1, PERF_SLOW_QUERY_MS=0)
+    def test_slow_queries_from_views(self):
+        with self.assertLogs('perf.queries', 'WARNING') as logs:
+            self.client.get(reverse('index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'index')
+        self.assertEqual(len(record['slow']), record['queries'])
+        self.assertTrue(any(query['stack'] for query in record['slow']))
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('perf.queries', 'WARNING'):
+                self.client.get(reverse('index'))
+
+
+def busy_loop_for_profiler(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilerTest(TestCase):
+    def setUp(self):
+        self.stop = threading.Event()
+        self.worker = threading.Thread(target=busy_loop_for_profiler,
+                                       args=(self.stop,), name='busy')
+        self.worker.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.worker.join()
+
+    def test_collapsed_stacks(self):
+        session = profiler.Profiler(0.3, interval=0.005).start()
+        session._thread.join()
+        self.assertGreater(session.samples, 10)
+        stacks = dict(line.rsplit(' ', 1)
+                      for line in session.collapsed().splitlines())
+        busy = [stack for stack in stacks
+                if stack.startswith('busy;')
+                and 'busy_loop_for_profiler (perf/tests.py:' in stack]
+        self.assertTrue(busy)
+        self.assertLessEqual(session.overhead, 0.2)
+
+    def test_overhead_is_bounded(self):
+        session = profiler.Profiler(0.3, interval=0.001, max_overhead=0.01)
+        session.sample = lambda: time.sleep(0.002)
+        session.start()
+        session._thread.join()
+        # Каждый замер стоит 2 мс, значит интервал вырос до ~200 мс.
+        self.assertLessEqual(session.samples, 3)
+
+    @override_settings(PERF_PROFILER_ENABLED=True, PERF_METRICS_TOKEN='t')
+    def test_endpoint(self):
+        url = reverse('perf_profile')
+        self.assertEqual(self.client.post(url, {'seconds': 1}).status_code,
+                         403)
+        auth = {'HTTP_AUTHORIZATION': 'Bearer t'}
+        response = self.client.post(
+            url, {'seconds': 0.2, 'interval': 0.005}, **auth)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.post(url, {'seconds': 1},
+                                          **auth).status_code, 409)
+        profiler.last_session()._thread.join()
+        response = self.client.get(url, **auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('busy_loop_for_profiler', response.content.decode())
+        self.assertGreater(int(response['X-Profile-Samples']), 0)
+
+    def test_disabled_by_default(self):
+        self.assertEqual(self.client.get(reverse('perf_profile')).status_code,
+                         404)
+
+
+class TemplatePreloadTest(TestCase):
+    def setUp(self):
+        self.engine = Engine.get_default()
+        self.addCleanup(templates.reset)
+        templates.reset()
+
+    def test_preload_fills_loader_cache(self):
+        loaded, errors = templates.preload(inline=False)
+        self.assertEqual(errors, [])
+        self.assertGreaterEqual(loaded, len(templates.template_names(
+            self.engine, root=settings.BASE_DIR)))
+        self.assertIs(self.engine.get_template('profile.html'),
+                      self.engine.get_template('profile.html'))
+
+    def test_check_templates(self):
+        self.assertEqual(templates.check_templates(None), [])
+        template = self.engine.from_string(
+            "{% include 'missing.html' %}{% include name %}"
+            "{% include 'footer.html' %}"
+        )
+        self.assertEqual(templates.missing_targets(self.engine, template),
+                         ['missing.html'])
+
+    def test_inline_includes_in_loops(self):
+        source = ("{% include 'footer.html' %}"
+                  "{% for year in years %}"
+                  "{% include 'footer.html' %}"
+                  "{% include 'footer.html' with year=0 only %}"
+                  "{% endfor %}")
+        context = {'years': [2019, 2020], 'year': 2018}
+        expected = self.engine.from_string(source).render(Context(context))
+
+        template = self.engine.from_string(source)
+        self.assertEqual(templates.inline_includes(self.engine, template), 2)
+        self.assertEqual(len(template.nodelist.get_nodes_by_type(
+            templates.InlinedIncludeNode)), 2)
+        self.assertEqual(template.render(Context(context)), expected)
+        self.assertIn('© 2020', expected)
+        self.assertIn('© 0', expected)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.metrics, name='metrics'),
+    path('profile/', views.profile, name='perf_profile'),
+]
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
+                         HttpResponseForbidden)
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+
+from . import metrics as registry
+from . import profiler
+
+
+def _has_token(request):
+    token = settings.PERF_METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(header, f'Bearer {token}')
+
+
+def _allowed(request):
+    if _has_token(request):
+        return True
+    return request.user.is_active and request.user.is_staff
+
+
+def metrics(request):
+    """Метрики процесса в текстовом формате Prometheus (только для staff)."""
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@csrf_exempt
+def profile(request):
+    """
+    POST seconds=N[&interval=S] запускает профилировщик в этом процессе
+    и сразу отвечает 202. GET отдаёт свёрнутые стеки последнего сеанса
+    или 202, пока он идёт. Запрос с токеном не проверяет CSRF.
+    """
+    if not settings.PERF_PROFILER_ENABLED:
+        raise Http404
+    if not _allowed(request):
+        return HttpResponseForbidden()
+
+    if request.method == 'POST':
+        if not _has_token(request):
+            failure = CsrfViewMiddleware(lambda request: None).process_view(
+                request, None, (), {})
+            if failure is not None:
+                return failure
+        try:
+            seconds = float(request.POST.get('seconds', 10))
+            interval = float(request.POST.get('interval', 0)) or None
+        except ValueError:
+            return HttpResponseBadRequest('seconds и interval — числа')
+        session = profiler.start(seconds, interval)
+        if session is None:
+            return HttpResponse('Профилировщик уже запущен', status=409)
+        response = HttpResponse(status=202)
+        response['Retry-After'] = int(session.seconds) + 1
+        return response
+
+    session = profiler.last_session()
+    if session is None:
+        raise Http404
+    if session.running:
+        response = HttpResponse(status=202)
+        response['Retry-After'] = 1
+        return response
+    response = HttpResponse(session.collapsed(),
+                            content_type='text/plain; charset=utf-8')
+    response['X-Profile-Samples'] = session.samples
+    response['X-Profile-Seconds'] = f'{session.elapsed:.2f}'
+    response['X-Profile-Overhead'] = f'{session.overhead:.4f}'
+    return response
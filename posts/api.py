@@ -0,0 +1,155 @@
+"""
+JSON API лент только для чтения: /api/v1/.
+
+Записи выбираются через .values(), без создания моделей, и только
+с колонками полей из ?fields= (по умолчанию все FIELDS). Пагинация та же,
+что у HTML-лент (posts.paginator): ?after=/?before= и готовые ссылки
+next/previous в ответе. JSON пишется без пробелов и без \\u-экранирования
+кириллицы — так он меньше и до сжатия, и после.
+
+ETag анонимных страниц считается по версиям областей кэша, как у HTML
+(posts.conditional), поэтому повторный запрос с If-None-Match получает 304
+без запросов к базе. Лента подписок персональна, её ETag — хэш содержимого.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.views.decorators.http import require_safe
+
+from . import timeline
+from .conditional import anonymous_condition, author_scopes, group_scopes
+from .models import Group, Post, User
+from .paginator import paginate
+
+# Поле ответа -> колонка Post.
+FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comment_count': 'comment_count',
+}
+KEYS = ('pub_date', 'id')
+# Строки ленты подписок — TimelineEntry, пост доступен через post__.
+TIMELINE_FIELDS = dict(
+    {name: f'post__{column}' for name, column in FIELDS.items()},
+    id='post_id', pub_date='pub_date',
+)
+TIMELINE_KEYS = ('pub_date', 'post_id')
+
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status,
+                        json_dumps_params=JSON_PARAMS)
+
+
+def selected_fields(request):
+    names = [name.strip()
+             for name in request.GET.get('fields', '').split(',')
+             if name.strip()]
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown:
+        raise ValueError('Неизвестные поля: ' + ', '.join(unknown))
+    return names or list(FIELDS)
+
+
+def _link(request, direction, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+    query[direction] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def feed_response(request, queryset, columns=FIELDS, keys=KEYS):
+    try:
+        fields = selected_fields(request)
+    except ValueError as exc:
+        return error(str(exc))
+    # Ключ сортировки нужен курсору, даже если его нет в ?fields=.
+    values = queryset.values(
+        *dict.fromkeys([columns[name] for name in fields] + list(keys))
+    )
+    page = paginate(request, values, settings.API_PAGE_SIZE, keys=keys)
+    results = []
+    for row in page.object_list:
+        item = {name: row[columns[name]] for name in fields}
+        if 'image' in item:
+            item['image'] = (settings.MEDIA_URL + item['image']
+                             if item['image'] else None)
+        results.append(item)
+    return JsonResponse({
+        'results': results,
+        'next': _link(request, 'after', page.next_cursor),
+        'previous': _link(request, 'before', page.previous_cursor),
+    }, json_dumps_params=JSON_PARAMS)
+
+
+def api_view(scopes):
+    """
+    GET/HEAD-представление API: валидаторы и кэш страниц для анонимных
+    (anonymous_condition), ETag по содержимому для остальных.
+    """
+    def decorator(view):
+        conditional_view = anonymous_condition(scopes)(view)
+
+        @require_safe
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if (response.status_code == 200
+                    and not response.has_header('ETag')):
+                set_response_etag(response)
+                return get_conditional_response(
+                    request, etag=response['ETag'], response=response)
+            return response
+        return wrapper
+    return decorator
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('Нужно войти', status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@api_view(lambda: ['posts'])
+def posts(request):
+    return feed_response(request, Post.objects.all())
+
+
+@api_view(group_scopes)
+def group_posts(request, slug):
+    try:
+        group_id = Group.objects.values_list('id', flat=True).get(slug=slug)
+    except Group.DoesNotExist:
+        return error('Группа не найдена', status=404)
+    return feed_response(request, Post.objects.filter(group_id=group_id))
+
+
+@api_view(author_scopes)
+def profile_posts(request, username):
+    try:
+        author_id = (User.objects.values_list('id', flat=True)
+                     .get(username=username))
+    except User.DoesNotExist:
+        return error('Автор не найден', status=404)
+    return feed_response(request, Post.objects.filter(author_id=author_id))
+
+
+@login_required
+@api_view(lambda: [])
+def follow(request):
+    return feed_response(request, timeline.entries_for(request.user),
+                         columns=TIMELINE_FIELDS, keys=TIMELINE_KEYS)
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import api
+
+urlpatterns = [
+    path('posts/', api.posts, name='api_posts'),
+    path('groups/<slug:slug>/posts/', api.group_posts,
+         name='api_group_posts'),
+    path('follow/', api.follow, name='api_follow'),
+    path('<str:username>/posts/', api.profile_posts,
+         name='api_profile_posts'),
+]
@@ -0,0 +1,99 @@
+"""
+Баннеры страниц, подготовленные при деплое.
+
+Команда build_banners один раз режет исходные файлы из BANNER_IMAGES до
+нужных размеров, сохраняет варианты с хэшем содержимого в имени и пишет
+манифест. Тег {% banner %} при рендере только читает манифест, загруженный
+в память процесса, — без обращений к диску и сети. Пока манифеста нет,
+тег отдаёт исходный файл из MEDIA_URL как есть.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+VARIANT_SCALES = (1, 0.5)
+
+
+def output_dir():
+    return os.path.join(settings.STATIC_ROOT, 'banners')
+
+
+def manifest_path():
+    return os.path.join(output_dir(), 'manifest.json')
+
+
+@lru_cache(maxsize=None)
+def load_manifest():
+    try:
+        with open(manifest_path(), encoding='utf-8') as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {}
+
+
+def resolve(name):
+    """Словарь src/srcset/width/height для баннера name."""
+    entry = load_manifest().get(name)
+    if entry is None:
+        source, geometry = settings.BANNER_IMAGES[name]
+        width, height = (int(side) for side in geometry.split('x'))
+        return {
+            'src': settings.MEDIA_URL + source,
+            'srcset': '',
+            'width': width,
+            'height': height,
+        }
+    return {
+        'src': settings.STATIC_URL + entry['variants'][0]['path'],
+        'srcset': ', '.join(
+            f"{settings.STATIC_URL}{variant['path']} {variant['width']}w"
+            for variant in entry['variants']
+        ),
+        'width': entry['width'],
+        'height': entry['height'],
+    }
+
+
+def build(name, source, geometry):
+    """Создаёт варианты одного баннера и возвращает запись манифеста."""
+    width, height = (int(side) for side in geometry.split('x'))
+    variants = []
+    with Image.open(os.path.join(settings.MEDIA_ROOT, source)) as original:
+        original = original.convert('RGB')
+        # Не растягиваем исходник: уменьшаем рамку с сохранением пропорций.
+        shrink = min(1, original.width / width, original.height / height)
+        width, height = int(width * shrink), int(height * shrink)
+        for scale in VARIANT_SCALES:
+            size = (int(width * scale), int(height * scale))
+            image = ImageOps.fit(original, size, Image.LANCZOS)
+            path = _save_hashed(image, f'{name}.{size[0]}x{size[1]}')
+            variants.append({'path': path, 'width': size[0]})
+    return {'width': width, 'height': height, 'variants': variants}
+
+
+def _save_hashed(image, stem):
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    data = buffer.getvalue()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f'{stem}.{digest}.jpg'
+    with open(os.path.join(output_dir(), filename), 'wb') as output:
+        output.write(data)
+    return f'banners/{filename}'
+
+
+def build_all():
+    os.makedirs(output_dir(), exist_ok=True)
+    manifest = {
+        name: build(name, source, geometry)
+        for name, (source, geometry) in settings.BANNER_IMAGES.items()
+    }
+    with open(manifest_path(), 'w', encoding='utf-8') as output:
+        json.dump(manifest, output, indent=2)
+    load_manifest.cache_clear()
+    return manifest
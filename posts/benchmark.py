@@ -0,0 +1,325 @@
+"""
+Синтетические данные и нагрузочный прогон представлений posts.
+
+seed_records() порождает группы, пользователей, посты, комментарии и
+подписки в формате posts.transfer, поэтому загрузка идёт тем же потоковым
+Importer, что и import_posts. Популярность авторов распределена по закону
+Ципфа: несколько авторов собирают большую часть подписчиков и постов.
+
+run() обходит все маршруты posts/urls.py и posts/api_urls.py тестовым
+клиентом по кругу и возвращает отчёт с перцентилями задержки, времени
+до первого байта и рендера шаблонов, числом запросов к базе и размером
+ответа для каждого маршрута.
+"""
+import math
+import random
+import re
+import statistics
+import subprocess
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import timedelta
+from itertools import accumulate
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from perf import templates
+
+from . import api_urls, urls
+from .models import Comment, Follow, Group, Post, User, UserCounters
+from .paginator import CursorPaginator
+
+# Время рендера шаблонов из заголовка perf.middleware.
+TEMPLATE_TIMING_RE = re.compile(r'tpl;dur=([\d.]+)')
+
+USER_PREFIX = 'bench_'
+GROUP_PREFIX = 'bench-'
+WORDS = ('город', 'дом', 'улица', 'мост', 'река', 'парк', 'башня', 'двор',
+         'вечер', 'утро', 'зима', 'лето', 'дорога', 'окно', 'крыша', 'сад',
+         'старый', 'новый', 'красивый', 'тихий', 'большой', 'маленький',
+         'building', 'street', 'river', 'bridge', 'tower', 'garden')
+SEARCH_WORD = 'город'
+
+Target = namedtuple('Target', 'name url_name method url data user')
+# Цели, которые меняют данные: run() откатывает их после замера.
+WRITE_TARGETS = frozenset(
+    {'profile_follow', 'profile_unfollow', 'add_comment', 'new_post'})
+
+
+def zipf_cum_weights(count, alpha):
+    return list(accumulate(1 / (rank + 1) ** alpha for rank in range(count)))
+
+
+def _text(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+def seed_records(users=1000, groups=20, posts=50000, comments=100000,
+                 follows=30, alpha=1.2, days=365, seed=1):
+    """
+    Записи для transfer.Importer. follows — среднее число подписок
+    пользователя; авторы для подписок и постов выбираются по Ципфу.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    usernames = [f'{USER_PREFIX}{i}' for i in range(users)]
+    cum_weights = zipf_cum_weights(users, alpha)
+
+    def popular_author():
+        return rng.choices(usernames, cum_weights=cum_weights)[0]
+
+    def moment():
+        return now - timedelta(seconds=rng.random() * days * 86400)
+
+    for i in range(groups):
+        yield {'type': 'group', 'slug': f'{GROUP_PREFIX}{i}',
+               'title': f'Группа {i}', 'description': _text(rng, 5, 20)}
+    for username in usernames:
+        yield {'type': 'user', 'username': username}
+
+    first_id = (Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    for post_id in range(first_id, first_id + posts):
+        group = None
+        if groups and rng.random() < 0.7:
+            group = rng.randrange(groups)
+        yield {'type': 'post', 'id': post_id, 'author': popular_author(),
+               'group': None if group is None else f'{GROUP_PREFIX}{group}',
+               'text': _text(rng, 5, 80), 'pub_date': moment()}
+    if posts:
+        for _ in range(comments):
+            yield {'type': 'comment',
+                   'post': rng.randrange(first_id, first_id + posts),
+                   'author': rng.choice(usernames),
+                   'text': _text(rng, 2, 30), 'created': moment()}
+
+    for username in usernames:
+        wanted = min(rng.randint(0, 2 * follows), users - 1)
+        authors = set()
+        while len(authors) < wanted:
+            author = popular_author()
+            if author != username:
+                authors.add(author)
+        for author in sorted(authors):
+            yield {'type': 'follow', 'user': username, 'author': author}
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга для отсортированного списка."""
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(values, digits=2):
+    values = sorted(values)
+    return {
+        'p50': round(percentile(values, 50), digits),
+        'p90': round(percentile(values, 90), digits),
+        'p99': round(percentile(values, 99), digits),
+        'max': round(values[-1], digits),
+        'mean': round(statistics.mean(values), digits),
+    }
+
+
+def build_targets(read_only=False):
+    """Запросы к каждому маршруту posts и API на засеянных данных."""
+    bench_users = UserCounters.objects.filter(
+        user__username__startswith=USER_PREFIX,
+    ).select_related('user')
+    reader = bench_users.order_by('-following').first().user
+    author = bench_users.order_by('-followers').first().user
+    other = bench_users.exclude(user=author).order_by('-followers')
+    other = other.first().user
+    post = Post.objects.filter(author=author).order_by('-comment_count')[0]
+    group = (Group.objects.annotate(size=Count('posts'))
+             .order_by('-size').first())
+    deep = (Post.objects.order_by('-pub_date', '-id')
+            .values_list('pub_date', 'id')[1000:1001])
+    paginator = CursorPaginator(Post.objects.all(), 15)
+
+    targets = [
+        Target('index', 'index', 'get', reverse('index'), None, None),
+        Target('group', 'group', 'get',
+               reverse('group', args=[group.slug]), None, None),
+        Target('search', 'search', 'get',
+               reverse('search'), {'q': SEARCH_WORD}, None),
+        Target('profile', 'profile', 'get',
+               reverse('profile', args=[author.username]), None, None),
+        Target('post', 'post_concrete', 'get',
+               reverse('post_concrete', args=[author.username, post.id]),
+               None, None),
+        Target('post_comments', 'post_comments', 'get',
+               reverse('post_comments', args=[author.username, post.id]),
+               {'format': 'json'}, None),
+        Target('follow_index', 'follow_index', 'get',
+               reverse('follow_index'), None, reader),
+        Target('new_post_form', 'new_post', 'get',
+               reverse('new_post'), None, author),
+        Target('post_edit_form', 'post_edit', 'get',
+               reverse('post_edit', args=[author.username, post.id]),
+               None, author),
+    ]
+    # Те же ленты через JSON API — для сравнения с HTML.
+    targets += [
+        Target('api_posts', 'api_posts', 'get',
+               reverse('api_posts'), None, None),
+        Target('api_group_posts', 'api_group_posts', 'get',
+               reverse('api_group_posts', args=[group.slug]), None, None),
+        Target('api_profile_posts', 'api_profile_posts', 'get',
+               reverse('api_profile_posts', args=[author.username]),
+               None, None),
+        Target('api_follow', 'api_follow', 'get',
+               reverse('api_follow'), None, reader),
+    ]
+    if deep:
+        pub_date, post_id = deep[0]
+        cursor = paginator.encode_cursor(Post(id=post_id, pub_date=pub_date))
+        targets.append(Target('index_deep', 'index', 'get',
+                              reverse('index'), {'after': cursor}, None))
+    if not read_only:
+        # run() откатывает каждый из этих запросов: данные не копятся.
+        targets += [
+            Target('profile_follow', 'profile_follow', 'get',
+                   reverse('profile_follow', args=[other.username]),
+                   None, reader),
+            Target('profile_unfollow', 'profile_unfollow', 'get',
+                   reverse('profile_unfollow', args=[other.username]),
+                   None, reader),
+            Target('add_comment', 'add_comment', 'post',
+                   reverse('add_comment', args=[author.username, post.id]),
+                   {'text': 'Комментарий из бенчмарка'}, reader),
+            Target('new_post', 'new_post', 'post', reverse('new_post'),
+                   {'text': 'Пост из бенчмарка'}, author),
+        ]
+    return targets
+
+
+def uncovered_routes(targets):
+    names = {pattern.name
+             for pattern in urls.urlpatterns + api_urls.urlpatterns}
+    return sorted(names - {target.url_name for target in targets})
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@override_settings(PERF_SERVER_TIMING=True)
+def run(targets, iterations=20, warmup=2, cold=False,
+        reset_templates=False):
+    """
+    Прогоняет цели по кругу: warmup раз без замеров, затем iterations
+    замеров. cold=True очищает кэш перед каждым запросом,
+    reset_templates=True — кэш скомпилированных шаблонов. Запросы
+    WRITE_TARGETS выполняются в транзакции, которая откатывается
+    после замера. Время рендера шаблонов берётся из Server-Timing,
+    поэтому на время прогона заголовок включается.
+    """
+    clients = {}
+    for target in targets:
+        if target.user not in clients:
+            clients[target.user] = Client()
+            if target.user is not None:
+                clients[target.user].force_login(target.user)
+
+    samples = {target.name: {'latency': [], 'ttfb': [], 'template': [],
+                             'queries': [], 'bytes': [], 'status': set()}
+               for target in targets}
+    for iteration in range(warmup + iterations):
+        for target in targets:
+            client = clients[target.user]
+            request = getattr(client, target.method)
+            if cold:
+                cache.clear()
+            if reset_templates:
+                templates.reset()
+            writes = target.name in WRITE_TARGETS
+            with transaction.atomic() if writes else nullcontext(), \
+                    CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request(target.url, target.data)
+                if response.streaming:
+                    # Первый байт потокового ответа готов раньше остальных.
+                    chunks = iter(response.streaming_content)
+                    content = next(chunks, b'')
+                    first_byte = time.perf_counter() - started
+                    content += b''.join(chunks)
+                else:
+                    content = response.content
+                    first_byte = time.perf_counter() - started
+                elapsed = time.perf_counter() - started
+                if writes:
+                    # Созданные строки и отложенные on_commit отбрасываются.
+                    transaction.set_rollback(True)
+            if iteration < warmup:
+                continue
+            sample = samples[target.name]
+            sample['latency'].append(elapsed * 1000)
+            sample['ttfb'].append(first_byte * 1000)
+            timing = TEMPLATE_TIMING_RE.search(
+                response.get('Server-Timing', ''))
+            if timing:
+                sample['template'].append(float(timing.group(1)))
+            sample['queries'].append(len(queries))
+            sample['bytes'].append(len(content))
+            sample['status'].add(response.status_code)
+
+    results = {}
+    for target in targets:
+        sample = samples[target.name]
+        results[target.name] = {
+            'method': target.method.upper(),
+            'url': target.url,
+            'status': sorted(sample['status']),
+            'latency_ms': summarize(sample['latency']),
+            'ttfb_ms': summarize(sample['ttfb']),
+            'template_ms': (summarize(sample['template'])
+                            if sample['template'] else None),
+            'queries': summarize(sample['queries'], digits=1),
+            'bytes': summarize(sample['bytes'], digits=0),
+        }
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'created': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'session_engine': settings.SESSION_ENGINE,
+            'streaming_feeds': settings.STREAMING_FEEDS,
+            'iterations': iterations,
+            'warmup': warmup,
+            'cold_cache': cold,
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'uncovered_routes': uncovered_routes(targets),
+        },
+        'targets': results,
+    }
+
+
+def compare(old, new):
+    """(цель, p50 было, p50 стало, запросов было, стало) для общих целей."""
+    for name, result in sorted(new['targets'].items()):
+        previous = old['targets'].get(name)
+        if previous is None:
+            continue
+        yield (name,
+               previous['latency_ms']['p50'], result['latency_ms']['p50'],
+               previous['queries']['mean'], result['queries']['mean'])
@@ -0,0 +1,126 @@
+"""
+Версионирование закэшированных фрагментов и защита от «давки» при промахе.
+
+Ключ фрагмента включает версии «областей» (post:<id>, group:<id>,
+user:<id>), от которых он зависит. Изменение данных увеличивает версию
+области, и все старые ключи перестают использоваться сами собой —
+удалять их не нужно.
+Вместе с версией запоминается время изменения области (last_modified),
+из которого строится заголовок Last-Modified страниц.
+
+get_or_compute() вычисляет значение одним процессом (блокировка через
+атомарный cache.add) и заранее обновляет его с вероятностью, растущей
+к концу срока жизни, чтобы записи не истекали у всех воркеров разом.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from perf.metrics import count_cache_lookup
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def _modified_key(scope):
+    return f'modified:{scope}'
+
+
+def _initial_version():
+    # Версия, потерянная при вытеснении, не должна совпасть со старой.
+    return int(time.time() * 1000)
+
+
+def get_versions(*scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def last_modified(*scopes):
+    """Время последнего изменения любой из областей (unix time)."""
+    keys = [_modified_key(scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            # Время вытесненной записи неизвестно: считаем, что сейчас.
+            cache.add(key, time.time(), None)
+            stamps[key] = cache.get(key)
+    return max(stamps.values())
+
+
+def bump(*scopes):
+    now = time.time()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def bump_on_commit(*scopes):
+    """
+    bump() после фиксации текущей транзакции: иначе параллельный запрос
+    успеет закэшировать под новой версией данные до коммита.
+    """
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def fragment_key(name, *scopes):
+    versions = get_versions(*scopes)
+    parts = [f'{scope}.{version}' for scope, version
+             in zip(scopes, versions)]
+    return ':'.join(['fragment', name] + parts)
+
+
+def _store(key, compute, timeout):
+    started = time.time()
+    value = compute()
+    finished = time.time()
+    cache.set(key, (value, finished - started, finished + timeout), timeout)
+    return value
+
+
+def get_or_compute(key, compute, timeout, beta=1.0, lock_timeout=10,
+                   poll_interval=0.05):
+    """
+    Значение из кэша или результат compute().
+
+    При промахе вычисляет только владелец блокировки, остальные ждут его
+    результата до lock_timeout секунд. Живая запись пересчитывается заранее
+    с вероятностью exp(-остаток срока / (beta * время вычисления)) —
+    алгоритм XFetch; пока один процесс обновляет запись, другие отдают
+    прежнее значение.
+    """
+    lock_key = f'lock:{key}'
+    entry = cache.get(key)
+    count_cache_lookup(hit=entry is not None)
+    if entry is not None:
+        value, delta, expires = entry
+        jitter = delta * beta * math.log(1 - random.random())
+        if time.time() - jitter < expires:
+            return value
+        if not cache.add(lock_key, 1, lock_timeout):
+            return value
+    else:
+        deadline = time.time() + lock_timeout
+        while not cache.add(lock_key, 1, lock_timeout):
+            time.sleep(poll_interval)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+            if time.time() > deadline:
+                return _store(key, compute, timeout)
+    try:
+        return _store(key, compute, timeout)
+    finally:
+        cache.delete(lock_key)
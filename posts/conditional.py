@@ -0,0 +1,124 @@
+"""
+Условные GET-запросы для страниц анонимных читателей.
+
+Валидаторы страницы считаются по кэшу: ETag — хэш версий областей
+(posts.caching), от которых зависит страница, Last-Modified — время
+последнего изменения этих областей. Области увеличивают обработчики
+сигналов в posts.signals:
+
+    posts              — любой пост или комментарий (ленты index и group);
+    author:<username>  — посты, комментарии к ним и подписки автора;
+    post:<id>          — пост, его комментарии и их авторы;
+    groups             — названия групп, видимые на всех страницах.
+
+Страницы группы, автора и поста сначала проверяют одним запросом, что
+объект есть: версии областей удалённого или переименованного объекта
+могли не измениться, и повторённый If-None-Match получил бы 304 вместо
+404. Для несуществующего объекта валидаторов нет.
+
+Ответы анонимным разрешено хранить общим кэшам PAGE_SHARED_MAX_AGE
+секунд, браузер перепроверяет их каждый раз. Страницы вошедших
+пользователей персональны: private и без валидаторов.
+"""
+import hashlib
+from datetime import date, datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import caching
+from .models import Group, Post, User
+from .pagecache import cache_anonymous_page
+
+
+def group_scopes(slug):
+    if not Group.objects.filter(slug=slug).exists():
+        return None
+    return ['posts']
+
+
+def author_scopes(username):
+    if not User.objects.filter(username=username).exists():
+        return None
+    return [f'author:{username}']
+
+
+def post_scopes(username, post_id):
+    if not Post.objects.filter(id=post_id,
+                               author__username=username).exists():
+        return None
+    return [f'post:{post_id}', f'author:{username}']
+
+
+def _validators(request, page_scopes):
+    """
+    (etag, last_modified) для анонимного GET или (None, None).
+    page_scopes() вызывается один раз за запрос.
+    """
+    if request.method not in ('GET', 'HEAD') or (
+            request.user.is_authenticated):
+        return None, None
+    cached = getattr(request, '_page_validators', None)
+    if cached is None:
+        if not hasattr(request, '_page_scopes'):
+            request._page_scopes = page_scopes()
+        scopes = request._page_scopes
+        if scopes is None:
+            return None, None
+        versions = caching.get_versions(*scopes)
+        # Номер года в подвале и релиз (шаблоны, статика) — тоже часть
+        # страницы.
+        source = ':'.join([settings.RELEASE, str(date.today().year)] +
+                          [f'{scope}.{version}' for scope, version
+                           in zip(scopes, versions)])
+        etag = hashlib.md5(source.encode()).hexdigest()
+        cached = request._page_validators = (
+            etag, caching.last_modified(*scopes),
+        )
+    return cached
+
+
+def anonymous_condition(scopes):
+    """
+    Декоратор представления: scopes(**kwargs) возвращает области, от
+    которых зависит страница, или None, если объекта страницы нет.
+    Анонимный GET с совпавшими If-None-Match или
+    If-Modified-Since получает 304 до вызова представления, остальные
+    анонимные GET могут быть отданы из кэша страниц (posts.pagecache).
+    """
+    def page_scopes(kwargs):
+        found = scopes(**kwargs)
+        if found is None:
+            return None
+        return tuple(found) + ('groups',)
+
+    def etag(request, *args, **kwargs):
+        return _validators(request, lambda: page_scopes(kwargs))[0]
+
+    def last_modified(request, *args, **kwargs):
+        stamp = _validators(request, lambda: page_scopes(kwargs))[1]
+        if stamp is None:
+            return None
+        return datetime.fromtimestamp(stamp, timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified)(
+            cache_anonymous_page(view)
+        )
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True)
+            else:
+                patch_cache_control(
+                    response, public=True, max_age=0, must_revalidate=True,
+                    s_maxage=settings.PAGE_SHARED_MAX_AGE,
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
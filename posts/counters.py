@@ -0,0 +1,85 @@
+"""
+Денормализованные счётчики подписчиков, подписок, постов и комментариев.
+
+Счётчики меняются атомарным UPDATE ... SET n = n + delta в той же
+транзакции, что и изменение исходной таблицы (обработчики сигналов
+в posts.signals). Возможный дрейф исправляет команда reconcile_counters.
+"""
+from django.db.models import Count, F
+
+from .models import Follow, Post, User, UserCounters
+
+
+def bump_user(user_id, field, delta):
+    # Отсутствующую строку или уход в минус не чиним на лету:
+    # это дрейф, который исправит reconcile_counters.
+    (UserCounters.objects
+     .filter(user_id=user_id, **{f'{field}__gte': max(-delta, 0)})
+     .update(**{field: F(field) + delta}))
+
+
+def bump_comments(post_id, delta):
+    (Post.objects
+     .filter(id=post_id, comment_count__gte=max(-delta, 0))
+     .update(comment_count=F('comment_count') + delta))
+
+
+def actual_user_counts(user_id):
+    return {
+        'followers': Follow.objects.filter(author_id=user_id).count(),
+        'following': Follow.objects.filter(user_id=user_id).count(),
+        'posts': Post.objects.filter(author_id=user_id).count(),
+    }
+
+
+def reconcile_user(user_id):
+    counters, _ = UserCounters.objects.update_or_create(
+        user_id=user_id, defaults=actual_user_counts(user_id),
+    )
+    return counters
+
+
+def grouped_counts(queryset, field):
+    return dict(queryset
+                .order_by()
+                .values_list(field)
+                .annotate(Count('id')))
+
+
+def user_drift():
+    """Пары (user_id, актуальные значения) для расходящихся счётчиков."""
+    followers = grouped_counts(Follow.objects, 'author')
+    following = grouped_counts(Follow.objects, 'user')
+    posts = grouped_counts(Post.objects, 'author')
+    stored = {row[0]: row[1:] for row in UserCounters.objects.values_list(
+        'user_id', 'followers', 'following', 'posts',
+    )}
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        actual = (followers.get(user_id, 0),
+                  following.get(user_id, 0),
+                  posts.get(user_id, 0))
+        if stored.get(user_id) != actual:
+            yield user_id, dict(zip(('followers', 'following', 'posts'),
+                                    actual))
+
+
+def comment_drift():
+    """Пары (post_id, актуальное число комментариев) для расходящихся."""
+    return (Post.objects
+            .order_by()
+            .annotate(actual=Count('comments'))
+            .exclude(comment_count=F('actual'))
+            .values_list('id', 'actual')
+            .iterator())
+
+
+def reconcile_all(dry_run=False):
+    users = list(user_drift())
+    posts = list(comment_drift())
+    if not dry_run:
+        for user_id, values in users:
+            UserCounters.objects.update_or_create(user_id=user_id,
+                                                  defaults=values)
+        for post_id, actual in posts:
+            Post.objects.filter(id=post_id).update(comment_count=actual)
+    return len(users), len(posts)
@@ -0,0 +1,11 @@
+"""
+Загрузка постов для лент без N+1 запросов.
+
+Авторы и группы подтягиваются соединением в основном запросе страницы,
+а количество комментариев хранится в самом посте (Post.comment_count,
+см. posts.counters).
+"""
+
+
+def load_posts(queryset):
+    return queryset.select_related('author', 'group')
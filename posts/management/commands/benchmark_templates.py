@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from perf import templates
+
+from posts import benchmark
+
+# Режим -> inline для perf.templates.preload; None — без предзагрузки.
+MODES = {
+    'lazy': None,
+    'preload': False,
+    'inline': True,
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время рендера шаблонов HTML-страниц posts на данных '
+            'seed_benchmark: lazy — шаблоны компилируются при запросе, как '
+            'у только что запущенного воркера; preload — заранее '
+            '(perf.templates.preload); inline — заранее и со встроенными '
+            '{% include %} в циклах. Кэш очищается перед каждым запросом, '
+            'чтобы страницы рендерились целиком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--output', default='-',
+            help="Куда записать отчёт, '-' — только вывести таблицу.",
+        )
+
+    def handle(self, *args, iterations, warmup, output, **options):
+        try:
+            targets = benchmark.build_targets(read_only=True)
+        except (AttributeError, IndexError):
+            raise CommandError('Нет данных: сначала запустите seed_benchmark')
+        # JSON-ответы шаблонов не рендерят.
+        targets = [target for target in targets
+                   if not target.url_name.startswith('api_')
+                   and target.url_name != 'post_comments']
+
+        reports = {}
+        for mode, inline in MODES.items():
+            templates.reset()
+            if inline is not None:
+                templates.preload(inline=inline)
+            reports[mode] = benchmark.run(
+                targets, iterations=iterations, warmup=warmup, cold=True,
+                reset_templates=inline is None,
+            )
+        templates.reset()
+
+        self.stdout.write(f'{"цель":<18}' + ''.join(
+            f'{mode + " мс":>12}' for mode in MODES))
+        for target in targets:
+            medians = [
+                reports[mode]['targets'][target.name]['template_ms']['p50']
+                for mode in MODES
+            ]
+            self.stdout.write(f'{target.name:<18}' + ''.join(
+                f'{median:>12}' for median in medians))
+
+        if output != '-':
+            with open(output, 'w', encoding='utf-8') as report_file:
+                json.dump(reports, report_file, indent=2, sort_keys=True,
+                          ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Отчёт записан в {output}'))
@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет маршруты posts тестовым клиентом на данных '
+            'seed_benchmark и пишет JSON-отчёт: перцентили задержки '
+            'и времени до первого байта, число запросов к базе и размер '
+            'ответа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--read-only', action='store_true',
+            help='Не запускать маршруты, которые меняют данные.',
+        )
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help="Куда записать отчёт, '-' — только вывести таблицу.",
+        )
+        parser.add_argument(
+            '--compare', metavar='REPORT',
+            help='Предыдущий отчёт, с которым сравнить p50 и число запросов.',
+        )
+
+    def handle(self, *args, iterations, warmup, cold, read_only, output,
+               compare, **options):
+        try:
+            targets = benchmark.build_targets(read_only=read_only)
+        except (AttributeError, IndexError):
+            raise CommandError('Нет данных: сначала запустите seed_benchmark')
+        report = benchmark.run(targets, iterations=iterations,
+                               warmup=warmup, cold=cold)
+
+        self.stdout.write(f'{"цель":<18}{"p50 мс":>9}{"p90 мс":>9}'
+                          f'{"p99 мс":>9}{"TTFB p50":>9}{"запросы":>9}'
+                          f'{"байты":>9}')
+        for name, result in report['targets'].items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f'{name:<18}{latency["p50"]:>9}{latency["p90"]:>9}'
+                f'{latency["p99"]:>9}{result["ttfb_ms"]["p50"]:>9}'
+                f'{result["queries"]["mean"]:>9}'
+                f'{result["bytes"]["p50"]:>9.0f}'
+            )
+        uncovered = report['meta']['uncovered_routes']
+        if uncovered:
+            self.stderr.write('Маршруты без цели: ' + ', '.join(uncovered))
+
+        if compare:
+            with open(compare, encoding='utf-8') as previous:
+                old = json.load(previous)
+            self.stdout.write('\nСравнение с ' + compare)
+            for name, old_p50, p50, old_queries, queries in (
+                    benchmark.compare(old, report)):
+                self.stdout.write(f'{name:<18}{old_p50:>9} -> {p50:<9}'
+                                  f'{old_queries:>6} -> {queries}')
+
+        if output != '-':
+            with open(output, 'w', encoding='utf-8') as report_file:
+                json.dump(report, report_file, indent=2, sort_keys=True,
+                          ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Отчёт записан в {output}'))
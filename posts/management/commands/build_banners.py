@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import banners
+
+
+class Command(BaseCommand):
+    help = ('Готовит баннеры страниц из BANNER_IMAGES: варианты размеров '
+            'с хэшем содержимого в имени и манифест для тега {% banner %}.')
+
+    def handle(self, *args, **options):
+        manifest = banners.build_all()
+        for name, entry in manifest.items():
+            paths = ', '.join(variant['path'] for variant in entry['variants'])
+            self.stdout.write(f'{name}: {paths}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Манифест: {banners.manifest_path()}'
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, пользователей, посты, комментарии и подписки '
+            'в JSON Lines (.gz сжимается).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help="Файл для записи, '-' — стандартный вывод.",
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за один запрос.',
+        )
+
+    def handle(self, *args, path, chunk_size, **options):
+        started = time.monotonic()
+        records = transfer.export_records(chunk_size)
+        if path == '-':
+            count = transfer.write_records(records, self.stdout)
+        else:
+            with transfer.open_stream(path, 'w') as output:
+                count = transfer.write_records(records, output)
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено записей: {count} за {elapsed:.1f} с '
+            f'({count / elapsed if elapsed else 0:.0f} в секунду)'
+        )
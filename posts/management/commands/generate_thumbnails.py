@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры карточек для всех постов с изображениями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов; 1 — генерировать в текущем процессе.',
+        )
+        parser.add_argument(
+            '--missing-only', action='store_true',
+            help='Пропускать посты, у которых миниатюра уже есть.',
+        )
+
+    def handle(self, *args, workers, missing_only, **options):
+        posts = (Post.objects
+                 .exclude(image='')
+                 .exclude(image__isnull=True)
+                 .only('id', 'image'))
+        jobs = ((post.id, post.image.name) for post in posts.iterator()
+                if not (missing_only
+                        and thumbnails.cached_thumbnail(post.image)))
+
+        started = time.monotonic()
+        done = failed = 0
+        if workers == 1:
+            for post_id, image_name in jobs:
+                try:
+                    thumbnails.generate(post_id, image_name)
+                    done += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{image_name}: {error}')
+        else:
+            with thumbnails.process_pool(workers) as pool:
+                futures = {pool.submit(thumbnails.generate, *job): job
+                           for job in jobs}
+                for future in as_completed(futures):
+                    if future.exception() is None:
+                        done += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(
+                            f'{futures[future][1]}: {future.exception()}'
+                        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, ошибок: {failed}, за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,66 @@
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters, transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает JSON Lines из export_posts пачками bulk_create, '
+            'затем пересчитывает счётчики и ленты подписок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help="Файл для чтения (.gz распаковывается), '-' — stdin.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей вставлять одной транзакцией.',
+        )
+        parser.add_argument(
+            '--progress-every', type=int, default=100000,
+            help='Как часто печатать прогресс (в записях).',
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики и ленты подписок после загрузки.',
+        )
+
+    def handle(self, *args, path, batch_size, progress_every, skip_derived,
+               **options):
+        importer = transfer.Importer(
+            batch_size=batch_size,
+            on_progress=self.report_progress,
+            progress_every=progress_every,
+        )
+        source = sys.stdin if path == '-' else transfer.open_stream(path, 'r')
+        try:
+            importer.run(transfer.read_records(source))
+        except transfer.RecordError as error:
+            raise CommandError(
+                f'{error}. Загружено до ошибки: {importer.total}'
+            )
+        finally:
+            if path != '-':
+                source.close()
+        counts = ', '.join(f'{kind} {count}'
+                           for kind, count in importer.counts.items())
+        self.stdout.write(
+            f'Загружено: {counts}; пропущено существующих: '
+            f'{importer.skipped}; {importer.rate():.0f} записей в секунду'
+        )
+
+        if not skip_derived:
+            started = time.monotonic()
+            users, posts = counters.reconcile_all()
+            call_command('rebuild_timelines', stdout=self.stdout)
+            self.stdout.write(
+                f'Счётчики исправлены: пользователей {users}, постов {posts} '
+                f'({time.monotonic() - started:.1f} с)'
+            )
+        self.stdout.write(self.style.SUCCESS('Импорт завершён'))
+
+    def report_progress(self, total, rate):
+        self.stdout.write(f'  {total} записей, {rate:.0f} в секунду')
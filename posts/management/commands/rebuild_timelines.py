@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry, User
+
+
+class Command(BaseCommand):
+    help = ('Заполняет ленты подписок по таблице Follow '
+            'или обрезает их до TIMELINE_LENGTH записей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='Обработать только указанных пользователей.',
+        )
+        parser.add_argument(
+            '--trim-only', action='store_true',
+            help='Не пересобирать ленты, только обрезать их.',
+        )
+
+    def handle(self, *args, usernames, trim_only, **options):
+        has_timeline = Q(id__in=TimelineEntry.objects.values('user_id'))
+        if trim_only:
+            users = User.objects.filter(has_timeline)
+        else:
+            users = User.objects.filter(
+                has_timeline | Q(id__in=Follow.objects.values('user_id'))
+            )
+        if usernames:
+            users = users.filter(username__in=usernames)
+
+        processed = 0
+        for user in users.iterator():
+            if trim_only:
+                timeline.trim(user)
+            else:
+                timeline.rebuild(user)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано лент: {processed}'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики подписчиков, подписок, постов '
+            'и комментариев по исходным таблицам и исправляет дрейф.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расходящихся счётчиков.',
+        )
+
+    def handle(self, *args, dry_run, **options):
+        with transaction.atomic():
+            users, posts = counters.reconcile_all(dry_run=dry_run)
+        verb = 'Найдено' if dry_run else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} расхождений: пользователей {users}, постов {posts}'
+        ))
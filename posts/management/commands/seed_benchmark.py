@@ -0,0 +1,52 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from posts import benchmark, counters, transfer
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, подписками '
+            '(распределение Ципфа), постами и комментариями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument(
+            '--follows', type=int, default=30,
+            help='Среднее число подписок одного пользователя.',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Показатель распределения популярности авторов.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней раскидать даты постов и комментариев.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        importer = transfer.Importer(
+            batch_size=batch_size,
+            on_progress=self.report_progress,
+        )
+        importer.run(enumerate(benchmark.seed_records(
+            users=options['users'], groups=options['groups'],
+            posts=options['posts'], comments=options['comments'],
+            follows=options['follows'], alpha=options['alpha'],
+            days=options['days'], seed=options['seed'],
+        ), 1))
+        counts = ', '.join(f'{kind} {count}'
+                           for kind, count in importer.counts.items())
+        self.stdout.write(
+            f'Создано: {counts}; {importer.rate():.0f} записей в секунду'
+        )
+        counters.reconcile_all()
+        call_command('rebuild_timelines', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Данные для бенчмарка готовы'))
+
+    def report_progress(self, total, rate):
+        self.stdout.write(f'  {total} записей, {rate:.0f} в секунду')
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Group, Post, UserCounters
+
+
+def top_pages(top):
+    """Главная и самые популярные профили, группы и посты."""
+    yield reverse('index')
+    for counters in (UserCounters.objects.select_related('user')
+                     .order_by('-followers')[:top]):
+        yield reverse('profile', args=[counters.user.username])
+    for group in (Group.objects.annotate(size=Count('posts'))
+                  .order_by('-size')[:top]):
+        yield reverse('group', args=[group.slug])
+    for post in (Post.objects.select_related('author')
+                 .order_by('-comment_count')[:top]):
+        yield reverse('post_concrete', args=[post.author.username, post.id])
+
+
+class Command(BaseCommand):
+    help = ('Заполняет кэш страниц для анонимных читателей: главная и по '
+            'N самых популярных профилей, групп и постов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='Сколько профилей, групп и постов прогреть.',
+        )
+
+    def handle(self, *args, top, **options):
+        if not settings.PAGE_CACHE_ENABLED:
+            raise CommandError('Кэш страниц выключен (YATUBE_PAGE_CACHE=1)')
+        client = Client()
+        states = {'miss': 0, 'hit': 0}
+        for url in top_pages(top):
+            response = client.get(url)
+            state = response.get('X-Page-Cache', 'skip')
+            self.stdout.write(f'{response.status_code} {state:<5} {url}')
+            if state in states:
+                states[state] += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето страниц: {states["miss"]}, '
+            f'уже были в кэше: {states["hit"]}'
+        ))
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.6 on 2026-10-18 18:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    Post = apps.get_model('posts', 'Post')
+    users = User.objects.annotate(
+        followers=Count('following', distinct=True),
+        following_=Count('follower', distinct=True),
+        posts_=Count('posts', distinct=True),
+    )
+    UserCounters.objects.bulk_create(
+        [UserCounters(user_id=user.id, followers=user.followers,
+                      following=user.following_, posts=user.posts_)
+         for user in users.iterator()],
+        batch_size=500,
+    )
+    posts = Post.objects.annotate(actual=Count('comments')).filter(actual__gt=0)
+    for post in posts.iterator():
+        Post.objects.filter(id=post.id).update(comment_count=post.actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0006_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.PositiveIntegerField(default=0)),
+                ('following', models.PositiveIntegerField(default=0)),
+                ('posts', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
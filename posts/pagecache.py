@@ -0,0 +1,75 @@
+"""
+Кэш целых страниц для анонимных читателей.
+
+Ключ страницы — её ETag (хэш версий областей, см. posts.conditional) и
+путь с параметрами. Сигналы об изменении постов, комментариев, подписок
+и групп увеличивают версии областей, поэтому после изменения страница
+получает новый ключ, а старая запись просто перестаёт читаться.
+
+Включается настройкой PAGE_CACHE_ENABLED. Кэшируются только ответы 200
+без cookie и не дольше самого короткого {% fragment_cache %} на странице.
+Попадания и промахи считает perf.metrics
+(yatube_cache_lookups_total{cache="page"} на /metrics/).
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from perf.metrics import count_cache_lookup
+
+
+def page_key(request, etag):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{etag}:{path}'
+
+
+def cache_anonymous_page(view):
+    """
+    Отдаёт страницу из кэша, если anonymous_condition посчитал для
+    запроса валидаторы (анонимный GET), иначе просто вызывает view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        validators = getattr(request, '_page_validators', None)
+        if not settings.PAGE_CACHE_ENABLED or validators is None:
+            return view(request, *args, **kwargs)
+        key = page_key(request, validators[0])
+        cached = cache.get(key)
+        count_cache_lookup(hit=cached is not None, kind='page')
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.cookies:
+            if response.streaming:
+                # Потоковая страница сохраняется, когда допишется.
+                response.streaming_content = _store_when_done(
+                    request, key, response.streaming_content,
+                    response['Content-Type'],
+                )
+            else:
+                _store(request, key, response.content,
+                       response['Content-Type'])
+            response['X-Page-Cache'] = 'miss'
+        return response
+    return wrapper
+
+
+def _store(request, key, content, content_type):
+    timeout = min(settings.PAGE_CACHE_TIMEOUT,
+                  getattr(request, 'fragment_timeout',
+                          settings.PAGE_CACHE_TIMEOUT))
+    cache.set(key, (content, content_type), timeout)
+
+
+def _store_when_done(request, key, chunks, content_type):
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    _store(request, key, b''.join(content), content_type)
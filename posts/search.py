@@ -0,0 +1,89 @@
+"""
+Полнотекстовый поиск по постам.
+
+На SQLite поиск идёт по виртуальной таблице FTS5 posts_post_fts
+(миграция 0008), которую триггеры держат в согласии с posts_post.text.
+Токенизатор unicode61 приводит к нижнему регистру кириллицу и латиницу.
+Каждое слово запроса ищется как префикс, результаты упорядочены по bm25.
+Миграции, пересоздающие таблицу posts_post, должны пересоздать и триггеры.
+
+На других СУБД используется медленный запасной путь через icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .feeds import load_posts
+from .models import Post
+
+WORD_RE = re.compile(r'\w+')
+
+MATCH_SQL = 'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s'
+
+
+def uses_fts():
+    return connection.vendor == 'sqlite'
+
+
+def to_match_expression(query):
+    """Строка запроса -> выражение MATCH: все слова как префиксы."""
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+def filter_posts(queryset, query):
+    """Посты из queryset, подходящие под запрос (без ранжирования)."""
+    expression = to_match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not uses_fts():
+        for word in WORD_RE.findall(query):
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+    return queryset.filter(id__in=RawSQL(MATCH_SQL, [expression]))
+
+
+class SearchResults:
+    """
+    Ранжированные результаты в виде, понятном django Paginator:
+    count() и срезы, которые возвращают посты в порядке релевантности.
+    """
+
+    def __init__(self, query):
+        self.expression = to_match_expression(query)
+        self.query = query
+
+    def count(self):
+        if not self.expression:
+            return 0
+        if not uses_fts():
+            return filter_posts(Post.objects, self.query).count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM posts_post_fts '
+                'WHERE posts_post_fts MATCH %s',
+                [self.expression],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        if not self.expression:
+            return []
+        offset = item.start or 0
+        limit = item.stop - offset
+        if not uses_fts():
+            return list(load_posts(filter_posts(Post.objects, self.query))
+                        [offset:offset + limit])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                MATCH_SQL + ' ORDER BY rank LIMIT %s OFFSET %s',
+                [self.expression, limit, offset],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = load_posts(Post.objects).in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
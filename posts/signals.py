@@ -0,0 +1,90 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching, counters, timeline
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+@receiver(post_save, sender=User)
+def create_counters(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, 'posts', 1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, 'followers', 1)
+        counters.bump_user(instance.user_id, 'following', 1)
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'followers', -1)
+    counters.bump_user(instance.user_id, 'following', -1)
+    timeline.remove(instance.user, instance.author)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    caching.bump_on_commit(f'post:{instance.id}', 'posts',
+                           f'author:{instance.author.username}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post(sender, instance, **kwargs):
+    # Число комментариев видно в карточке поста во всех лентах.
+    caching.bump_on_commit(f'post:{instance.post_id}', 'posts',
+                           f'author:{instance.post.author.username}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    caching.bump_on_commit(f'author:{instance.author.username}',
+                           f'author:{instance.user.username}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    caching.bump_on_commit(f'group:{instance.id}', 'groups')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, created, update_fields, **kwargs):
+    # Вход пользователя обновляет только last_login — это не видно.
+    if created or update_fields == frozenset(['last_login']):
+        return
+    # Имя автора комментария видно на странице поста.
+    commented = (Comment.objects.filter(author=instance).order_by()
+                 .values_list('post_id', flat=True).distinct())
+    caching.bump_on_commit('posts', f'author:{instance.username}',
+                           f'user:{instance.pk}',
+                           *[f'post:{post_id}' for post_id in commented])
@@ -0,0 +1,46 @@
+"""
+Потоковый рендер длинных лент.
+
+render_feed() рендерит страницу как обычно, но циклы {% stream_for %}
+(posts.templatetags.streaming) вместо карточек оставляют метку и
+откладывают их рендер. Клиент сразу получает всё до метки — шапку
+base.html, навигацию, баннер, — затем карточки по одной по мере рендера
+и остаток страницы. Включается настройкой STREAMING_FEEDS; без неё и для
+кэшируемых фрагментов {% stream_for %} работает как обычный {% for %}.
+"""
+import uuid
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.template import loader
+
+CONTEXT_KEY = '_stream'
+
+
+class Stream:
+    def __init__(self):
+        self.marker = f'<!--stream:{uuid.uuid4().hex}-->'
+        self.deferred = []
+
+    def defer(self, chunks):
+        """Откладывает рендер chunks и возвращает метку для шаблона."""
+        self.deferred.append(chunks)
+        return self.marker
+
+    def chunks(self, html):
+        parts = html.split(self.marker)
+        yield parts[0]
+        for deferred, tail in zip(self.deferred, parts[1:]):
+            yield from deferred
+            yield tail
+
+
+def render_feed(request, template_name, context):
+    if not settings.STREAMING_FEEDS:
+        return render(request, template_name, context)
+    stream = Stream()
+    html = loader.render_to_string(
+        template_name, dict(context, **{CONTEXT_KEY: stream}), request,
+    )
+    return StreamingHttpResponse(stream.chunks(html))
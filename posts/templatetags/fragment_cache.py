@@ -0,0 +1,77 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from posts import caching
+from posts.streaming import CONTEXT_KEY
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on, scopes=()):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+        self.scopes = scopes
+
+    def render(self, context):
+        timeout = int(self.timeout.resolve(context))
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        name = self.name
+        request = context.get('request')
+        if self.scopes and getattr(request, '_page_validators', None):
+            # У страницы есть ETag по версиям областей (posts.conditional):
+            # фрагмент меняется вместе с ним, иначе новый ETag уйдёт
+            # со старым телом.
+            name = caching.fragment_key(
+                name, *[scope.resolve(context) for scope in self.scopes])
+        key = make_template_fragment_key(name, vary_on)
+        if request is not None:
+            # Кэш страниц не должен хранить фрагмент дольше него самого.
+            request.fragment_timeout = min(
+                getattr(request, 'fragment_timeout', timeout), timeout,
+            )
+        return caching.get_or_compute(
+            key, lambda: self.render_nodelist(context), timeout,
+        )
+
+    def render_nodelist(self, context):
+        # В кэш идёт готовый HTML: {% stream_for %} внутри фрагмента
+        # рендерится сразу.
+        with context.push({CONTEXT_KEY: None}):
+            return self.nodelist.render(context)
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """
+    Аналог {% cache %}, который пересчитывает фрагмент одним процессом
+    и обновляет его заранее (см. posts.caching.get_or_compute).
+
+        {% fragment_cache 20 index_page request.GET.after scope='posts' %}
+            ...
+        {% endfragment_cache %}
+
+    Аргументы scope= — области posts.caching, при изменении которых
+    фрагмент пересчитывается, если у страницы есть валидаторы
+    (posts.conditional, анонимные GET). Без них фрагмент живёт свой
+    срок, как {% cache %}.
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 2 arguments."
+        )
+    vary_on = [bit for bit in bits[3:] if not bit.startswith('scope=')]
+    scopes = [bit[len('scope='):] for bit in bits[3:]
+              if bit.startswith('scope=')]
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in vary_on],
+        [parser.compile_filter(scope) for scope in scopes],
+    )
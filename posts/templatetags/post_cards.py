@@ -0,0 +1,54 @@
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from posts import banners, caching, thumbnails
+
+register = template.Library()
+
+BODY_TEMPLATE = 'mini-templates/post_card_body.html'
+ACTIONS_TEMPLATE = 'mini-templates/post_card_actions.html'
+ACTIONS_MARKER = '<!-- post-card-actions -->'
+
+
+def card_scopes(post):
+    # user:<id> — имя и ссылка на профиль автора в карточке.
+    scopes = [f'post:{post.id}', f'user:{post.author_id}']
+    if post.group_id:
+        scopes.append(f'group:{post.group_id}')
+    return scopes
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """
+    Карточка поста. Общая для всех зрителей часть берётся из кэша по
+    версии поста, его автора и группы, кнопки, зависящие от зрителя,
+    подставляются в неё на каждом рендере.
+    """
+    engine = context.template.engine
+    key = caching.fragment_key('post_card', *card_scopes(post))
+    body = caching.get_or_compute(
+        key,
+        lambda: engine.get_template(BODY_TEMPLATE).render(
+            context.new({'post': post})
+        ),
+        settings.POST_CARD_CACHE_TIMEOUT,
+    )
+    actions = engine.get_template(ACTIONS_TEMPLATE).render(
+        context.new({'post': post, 'user': context.get('user')})
+    )
+    return mark_safe(body.replace(ACTIONS_MARKER, actions))
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """URL готовой миниатюры поста или None, если она ещё создаётся."""
+    thumbnail = thumbnails.cached_thumbnail(post.image)
+    return thumbnail.url if thumbnail else None
+
+
+@register.inclusion_tag('mini-templates/banner.html')
+def banner(name):
+    """Баннер страницы из манифеста build_banners."""
+    return banners.resolve(name)
@@ -0,0 +1,65 @@
+from django import template
+from django.template.defaulttags import ForNode
+from perf import templates
+
+from posts.streaming import CONTEXT_KEY
+
+register = template.Library()
+
+
+class StreamForNode(ForNode):
+    def render(self, context):
+        stream = context.get(CONTEXT_KEY)
+        if stream is None:
+            return super().render(context)
+        items = list(self.sequence.resolve(context, ignore_failures=True)
+                     or [])
+        # Контекст шаблона после рендера меняется, элементы рендерятся
+        # из его снимка.
+        return stream.defer(self.render_items(
+            context.new(context.flatten()), items,
+        ))
+
+    def render_items(self, context, items):
+        parentloop = context.get('forloop', {})
+        length = len(items)
+        for index, item in enumerate(items):
+            if len(self.loopvars) == 1:
+                values = {self.loopvars[0]: item}
+            else:
+                values = dict(zip(self.loopvars, item))
+            values['forloop'] = {
+                'parentloop': parentloop,
+                'counter0': index,
+                'counter': index + 1,
+                'revcounter': length - index,
+                'revcounter0': length - index - 1,
+                'first': index == 0,
+                'last': index == length - 1,
+            }
+            with context.push(values), templates.timed():
+                html = self.nodelist_loop.render(context)
+            yield html
+
+
+@register.tag
+def stream_for(parser, token):
+    """
+    {% for %}, элементы которого при потоковом рендере (posts.streaming)
+    отдаются клиенту по одному:
+
+        {% stream_for post in page %}
+            {% include 'mini-templates/post_card.html' %}
+        {% endstream_for %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 4 or bits[-2] != 'in':
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' statements should use the format "
+            f"'{bits[0]} x in y'."
+        )
+    loopvars = [var.strip() for var in ' '.join(bits[1:-2]).split(',')]
+    nodelist = parser.parse(('endstream_for',))
+    parser.delete_first_token()
+    return StreamForNode(loopvars, parser.compile_filter(bits[-1]),
+                         False, nodelist)
@@ -0,0 +1,120 @@
+"""
+Планы запросов представлений posts/views.py.
+
+Каждый SELECT/UPDATE/DELETE, выполненный представлением, прогоняется
+через EXPLAIN QUERY PLAN. Тест падает, если SQLite читает таблицу целиком
+без индекса или строит временное B-дерево для сортировки.
+"""
+import re
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+
+# «SCAN TABLE posts_post» в старых версиях SQLite, «SCAN posts_post» в новых;
+# «SCAN ... USING INDEX» и виртуальные таблицы FTS допустимы.
+FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+TEMP_BTREE = 'USE TEMP B-TREE'
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+# Выпадающий список групп в форме поста выбирает все группы намеренно.
+ALLOWED_SCANS = {'posts_group'}
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+@override_settings(THUMBNAIL_EXECUTOR='sync')
+class QueryPlanTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='plans', slug='plans', description='plans')
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(16):
+            self.post = Post.objects.create(
+                text=f'запрос {i}', author=self.author, group=self.group)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='комментарий')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def bad_plans(self, queries):
+        problems = []
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith(EXPLAINED):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                details = [row[-1] for row in cursor.fetchall()]
+            for detail in details:
+                scan = FULL_SCAN_RE.match(detail)
+                if scan and scan.group(1) not in ALLOWED_SCANS or (
+                        TEMP_BTREE in detail):
+                    problems.append(f'{detail}\n    {sql}')
+        return problems
+
+    def assert_plans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertIn(response.status_code, (200, 302), url)
+        problems = self.bad_plans(queries)
+        self.assertFalse(problems, f'{method.upper()} {url}:\n' +
+                         '\n'.join(problems))
+        return response
+
+    def assert_feed_plans(self, url):
+        response = self.assert_plans('get', url)
+        next_cursor = response.context['page'].next_cursor
+        self.assertIsNotNone(next_cursor, url)
+        response = self.assert_plans('get', f'{url}?after={next_cursor}')
+        previous_cursor = response.context['page'].previous_cursor
+        self.assert_plans('get', f'{url}?before={previous_cursor}')
+
+    def test_feeds(self):
+        self.assert_feed_plans(reverse('index'))
+        self.assert_feed_plans(reverse('group', args=[self.group.slug]))
+        self.assert_feed_plans(reverse('profile', args=[self.author.username]))
+        self.assert_feed_plans(reverse('follow_index'))
+
+    def test_post_page(self):
+        self.assert_plans('get', reverse(
+            'post_concrete', args=[self.author.username, self.post.id]))
+        self.assert_plans('get', reverse(
+            'post_comments', args=[self.author.username, self.post.id]),
+            {'format': 'json'})
+
+    @override_settings(API_PAGE_SIZE=5)
+    def test_api(self):
+        for name, args in (('api_posts', []),
+                           ('api_group_posts', [self.group.slug]),
+                           ('api_profile_posts', [self.author.username]),
+                           ('api_follow', [])):
+            response = self.assert_plans('get', reverse(name, args=args))
+            self.assert_plans('get', response.json()['next'])
+
+    def test_search(self):
+        self.assert_plans('get', reverse('search'), {'q': 'запрос'})
+
+    def test_writes(self):
+        self.assert_plans('get', reverse('new_post'))
+        self.assert_plans('post', reverse('new_post'),
+                          {'text': 'новый пост', 'group': self.group.id})
+        self.assert_plans('post', reverse(
+            'add_comment', args=[self.author.username, self.post.id]),
+            {'text': 'ещё комментарий'})
+        self.assert_plans('get', reverse(
+            'profile_unfollow', args=[self.author.username]))
+        self.assert_plans('get', reverse(
+            'profile_follow', args=[self.author.username]))
+
+    def test_post_edit(self):
+        self.client.force_login(self.author)
+        url = reverse('post_edit', args=[self.author.username, self.post.id])
+        self.assert_plans('get', url)
+        self.assert_plans('post', url, {'text': 'правка',
+                                        'group': self.group.id})
@@ -0,0 +1,115 @@
+"""
+Генерация миниатюр вне запроса.
+
+Карточка поста при рендере только спрашивает у key-value хранилища sorl,
+готова ли миниатюра (cached_thumbnail), и показывает заглушку, пока её нет.
+Сами миниатюры создаёт пул фоновых процессов: задача ставится после
+коммита в new_post/post_edit и командой generate_thumbnails. По готовности
+увеличиваются версии поста, его автора, группы и лент, и закэшированные
+карточки и страницы перерисовываются.
+
+THUMBNAIL_EXECUTOR: 'sync' (по умолчанию), 'process' или 'thread'.
+
+cached_thumbnail() повторяет, как sorl-thumbnail 12.6.3 (версия
+закреплена в requirements.txt) строит имя миниатюры: публичного способа
+найти готовую миниатюру без её генерации у sorl нет. ThumbnailTest
+сверяет это имя с get_thumbnail(), поэтому обновление sorl, которое
+меняет схему имён, остановит тесты, а не молча оставит заглушки.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+POST_CARD_GEOMETRY = '960x339'
+POST_CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+
+
+def cached_thumbnail(image, geometry=POST_CARD_GEOMETRY, **options):
+    """Готовая миниатюра из хранилища sorl или None, без генерации."""
+    if not image:
+        return None
+    options = {**POST_CARD_OPTIONS, **options}
+    backend = default.backend
+    source = ImageFile(image)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def generate(post_id, image_name):
+    get_thumbnail(image_name, POST_CARD_GEOMETRY, **POST_CARD_OPTIONS)
+    # Карточка с миниатюрой есть во всех лентах поста, а не только на его
+    # странице: их ETag и кэш страниц зависят от этих областей.
+    scopes = [f'post:{post_id}']
+    post = (Post.objects.filter(id=post_id)
+            .values_list('author__username', 'group_id').first())
+    if post is not None:
+        username, group_id = post
+        scopes += ['posts', f'author:{username}']
+        if group_id:
+            scopes.append(f'group:{group_id}')
+    caching.bump(*scopes)
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Thumbnail generation failed', exc_info=error)
+
+
+def process_pool(workers):
+    # spawn, а не fork: дочерний процесс не наследует открытые соединения
+    # с БД и потоки родителя, а настраивает Django заново.
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        if settings.THUMBNAIL_EXECUTOR == 'process':
+            _executor = process_pool(settings.THUMBNAIL_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def schedule(post):
+    if not post.image:
+        return None
+    if settings.THUMBNAIL_EXECUTOR == 'sync':
+        try:
+            generate(post.id, post.image.name)
+        except Exception:
+            logger.exception('Thumbnail generation failed')
+        return None
+    future = get_executor().submit(generate, post.id, post.image.name)
+    future.add_done_callback(_log_failure)
+    return future
@@ -0,0 +1,129 @@
+"""
+Материализованная лента подписок (fan-out on write).
+
+При публикации поста запись о нём раскладывается в ленты всех подписчиков
+автора, при подписке лента дополняется последними постами автора, при
+отписке — очищается от них. Страница /follow/ читает готовый
+отсортированный срез по индексу (user, -pub_date, -post), без соединения
+Post -> User -> Follow.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Follow, Post, TimelineEntry
+
+
+def entries_for(user):
+    """
+    Лента пользователя; её длину ограничивают fan_out(), backfill() и
+    rebuild() — в ней не больше TIMELINE_LENGTH записей.
+    """
+    return (TimelineEntry.objects
+            .filter(user=user)
+            .select_related('post__author', 'post__group'))
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    follower_ids = list(Follow.objects
+                        .filter(author_id=post.author_id)
+                        .values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim_many(follower_ids)
+
+
+@transaction.atomic
+def backfill(user, author):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = (Post.objects
+             .filter(author=author)
+             .values_list('id', 'pub_date')
+             [:settings.TIMELINE_LENGTH])
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user=user, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(user)
+
+
+def remove(user, author):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def trim(user):
+    """Удаляет из ленты записи сверх TIMELINE_LENGTH самых свежих."""
+    boundary = (TimelineEntry.objects
+                .filter(user=user)
+                .values_list('pub_date', 'post_id')
+                [settings.TIMELINE_LENGTH:settings.TIMELINE_LENGTH + 1])
+    boundary = list(boundary)
+    if not boundary:
+        return 0
+    pub_date, post_id = boundary[0]
+    deleted, _ = (TimelineEntry.objects
+                  .filter(user=user, pub_date__lte=pub_date)
+                  .exclude(pub_date=pub_date, post_id__gt=post_id)
+                  .delete())
+    return deleted
+
+
+def trim_many(user_ids):
+    """
+    trim() для многих лент: позиции записей считает оконная функция,
+    один запрос на пачку из TIMELINE_BATCH_SIZE пользователей вместо
+    двух на каждого. Лишние id удаляются отдельным запросом: MySQL не
+    даёт DELETE читать свою же таблицу в подзапросе.
+    """
+    size = settings.TIMELINE_BATCH_SIZE
+    deleted = 0
+    for start in range(0, len(user_ids), size):
+        ranked = (TimelineEntry.objects
+                  .filter(user_id__in=user_ids[start:start + size])
+                  .annotate(position=Window(
+                      RowNumber(), partition_by=[F('user_id')],
+                      order_by=[F('pub_date').desc(), F('post_id').desc()],
+                  ))
+                  .order_by()
+                  .values('id', 'position'))
+        # Django 2.2 не фильтрует по оконным выражениям: внешний запрос
+        # с условием на position пишется вручную.
+        sql, params = ranked.query.sql_with_params()
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {qn("ranked")}.{qn("id")} FROM ({sql}) '
+                f'{qn("ranked")} WHERE {qn("ranked")}.{qn("position")} > %s',
+                [*params, settings.TIMELINE_LENGTH],
+            )
+            excess = [row[0] for row in cursor.fetchall()]
+        for offset in range(0, len(excess), size):
+            count, _ = (TimelineEntry.objects
+                        .filter(pk__in=excess[offset:offset + size])
+                        .delete())
+            deleted += count
+    return deleted
+
+
+@transaction.atomic
+def rebuild(user):
+    """Пересобирает ленту пользователя с нуля по таблице подписок."""
+    TimelineEntry.objects.filter(user=user).delete()
+    posts = (Post.objects
+             .filter(author__following__user=user)
+             .values_list('id', 'pub_date')
+             [:settings.TIMELINE_LENGTH])
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user=user, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+    )
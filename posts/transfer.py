@@ -0,0 +1,297 @@
+"""
+Потоковый импорт и экспорт контента в JSON Lines.
+
+Каждая строка файла — одна запись с полем "type": group, user, post,
+comment или follow. Экспорт пишет их в этом порядке, читая таблицы
+итераторами, импорт читает файл генератором и вставляет записи пачками
+через bulk_create, каждая пачка — в своей транзакции. В памяти держатся
+только текущая пачка и словари username -> id и slug -> id.
+
+Посты и комментарии сохраняют id из файла, поэтому комментарии ссылаются
+на пост по его id. Запись, чей id уже занят такой же записью (тот же
+автор и текст), пропускается — повторный импорт ничего не дублирует.
+Если id занят другой записью, импорт останавливается с RecordError:
+иначе пост молча потерялся бы, а его комментарии достались бы чужому.
+bulk_create не посылает сигналы: счётчики и ленты подписок после импорта
+нужно пересчитать (команда import_posts делает это сама).
+"""
+import gzip
+import json
+import time
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import DateTimeField
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post, User
+
+RECORD_TYPES = ('group', 'user', 'post', 'comment', 'follow')
+USER_FIELDS = ('username', 'first_name', 'last_name', 'email', 'date_joined')
+
+
+class RecordError(ValueError):
+    def __init__(self, line_number, message):
+        super().__init__(f'строка {line_number}: {message}')
+
+
+def open_stream(path, mode):
+    """Текстовый файл; .gz сжимается и распаковывается на лету."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_records(lines):
+    """(номер строки, запись) для непустых строк файла."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise RecordError(number, f'некорректный JSON ({error})')
+        kind = record.get('type')
+        if kind not in RECORD_TYPES:
+            raise RecordError(number, f'неизвестный тип записи {kind!r}')
+        yield number, record
+
+
+def export_records(chunk_size=2000):
+    """Генератор записей для экспорта всего контента."""
+    for group in Group.objects.order_by('id').values(
+            'slug', 'title', 'description').iterator(chunk_size):
+        yield {'type': 'group', **group}
+    for user in User.objects.order_by('id').values(
+            *USER_FIELDS).iterator(chunk_size):
+        yield {'type': 'user', **user}
+    posts = (Post.objects.order_by('id')
+             .values_list('id', 'author__username', 'group__slug', 'text',
+                          'pub_date', 'image'))
+    for id, author, group, text, pub_date, image in posts.iterator(chunk_size):
+        yield {'type': 'post', 'id': id, 'author': author, 'group': group,
+               'text': text, 'pub_date': pub_date, 'image': image or None}
+    comments = (Comment.objects.order_by('id')
+                .values_list('id', 'post_id', 'author__username', 'text',
+                             'created'))
+    for id, post, author, text, created in comments.iterator(chunk_size):
+        yield {'type': 'comment', 'id': id, 'post': post, 'author': author,
+               'text': text, 'created': created}
+    follows = (Follow.objects.order_by('id')
+               .values_list('user__username', 'author__username'))
+    for user, author in follows.iterator(chunk_size):
+        yield {'type': 'follow', 'user': user, 'author': author}
+
+
+def write_records(records, output):
+    count = 0
+    for record in records:
+        output.write(json.dumps(record, cls=DjangoJSONEncoder,
+                                ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+@contextmanager
+def keep_timestamps():
+    """
+    auto_now_add перезаписал бы даты из файла при bulk_create,
+    поэтому на время импорта он отключается.
+    """
+    fields = [Post._meta.get_field('pub_date'),
+              Comment._meta.get_field('created')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Importer:
+    """Собирает записи одного типа в пачку и вставляет её целиком."""
+
+    def __init__(self, batch_size=1000, on_progress=None,
+                 progress_every=100000):
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.progress_every = progress_every
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.counts = dict.fromkeys(RECORD_TYPES, 0)
+        self.skipped = 0
+        self.batch = []
+        self.batch_type = None
+        self.started = time.monotonic()
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.total / elapsed if elapsed else 0.0
+
+    def run(self, records):
+        with keep_timestamps():
+            for number, record in records:
+                # Записи следующего типа могут ссылаться на текущую пачку.
+                if record['type'] != self.batch_type:
+                    self.flush()
+                    self.batch_type = record['type']
+                obj = self.build(number, record)
+                if obj is None:
+                    self.skipped += 1
+                    continue
+                self.batch.append((number, obj))
+                if len(self.batch) >= self.batch_size:
+                    self.flush()
+            self.flush()
+        return self.counts
+
+    def user_id(self, number, username):
+        try:
+            return self.users[username]
+        except KeyError:
+            raise RecordError(number, f'неизвестный пользователь {username!r}')
+
+    def group_id(self, number, slug):
+        if not slug:
+            return None
+        try:
+            return self.groups[slug]
+        except KeyError:
+            raise RecordError(number, f'неизвестная группа {slug!r}')
+
+    @staticmethod
+    def value(model, name, record):
+        field = model._meta.get_field(name)
+        value = field.to_python(record.get(name))
+        if value is None and isinstance(field, DateTimeField):
+            return timezone.now()
+        return value
+
+    def build(self, number, record):
+        """Объект модели для записи или None, если он уже есть в базе."""
+        try:
+            kind = record['type']
+            if kind == 'group':
+                if record['slug'] in self.groups:
+                    return None
+                return Group(slug=record['slug'], title=record['title'],
+                             description=record.get('description', ''))
+            if kind == 'user':
+                if record['username'] in self.users:
+                    return None
+                user = User(**{name: self.value(User, name, record)
+                               for name in USER_FIELDS if name in record})
+                user.set_unusable_password()
+                return user
+            if kind == 'post':
+                return Post(
+                    id=record.get('id'),
+                    author_id=self.user_id(number, record['author']),
+                    group_id=self.group_id(number, record.get('group')),
+                    text=record['text'],
+                    pub_date=self.value(Post, 'pub_date', record),
+                    image=record.get('image') or None,
+                )
+            if kind == 'comment':
+                return Comment(
+                    id=record.get('id'),
+                    post_id=self.value(Comment, 'post', record),
+                    author_id=self.user_id(number, record['author']),
+                    text=record['text'],
+                    created=self.value(Comment, 'created', record),
+                )
+            follow = Follow(
+                user_id=self.user_id(number, record['user']),
+                author_id=self.user_id(number, record['author']),
+            )
+            if follow.user_id == follow.author_id:
+                raise RecordError(number, 'подписка на самого себя')
+            return follow
+        except KeyError as error:
+            raise RecordError(number, f'нет поля {error}')
+        except ValidationError as error:
+            raise RecordError(number, '; '.join(error.messages))
+
+    # Поля, по которым запись из файла совпадает с записью с тем же id.
+    SAME_RECORD = {
+        'post': ('author_id', 'text'),
+        'comment': ('post_id', 'author_id', 'text'),
+    }
+
+    def new_objects(self, kind, batch):
+        """
+        Объекты пачки, которых ещё нет в базе. RecordError, если
+        комментарий ссылается на несуществующий пост или id занят.
+        """
+        if kind == 'comment':
+            posts = set(Post.objects
+                        .filter(id__in={obj.post_id for _, obj in batch})
+                        .values_list('id', flat=True))
+            for number, obj in batch:
+                if obj.post_id not in posts:
+                    raise RecordError(
+                        number, f'неизвестный пост {obj.post_id}')
+        if kind in self.SAME_RECORD:
+            fields = self.SAME_RECORD[kind]
+            model = type(batch[0][1])
+            existing = model.objects.in_bulk(
+                [obj.id for _, obj in batch if obj.id is not None])
+            fresh = []
+            for number, obj in batch:
+                current = existing.get(obj.id)
+                if current is None:
+                    fresh.append(obj)
+                elif any(getattr(current, name) != getattr(obj, name)
+                         for name in fields):
+                    raise RecordError(
+                        number, f'id {obj.id} уже занят другой записью')
+            return fresh
+        if kind == 'follow':
+            pairs = {(obj.user_id, obj.author_id): obj for _, obj in batch}
+            existing = set(Follow.objects
+                           .filter(user_id__in={u for u, _ in pairs},
+                                   author_id__in={a for _, a in pairs})
+                           .values_list('user_id', 'author_id'))
+            return [obj for pair, obj in pairs.items()
+                    if pair not in existing]
+        return [obj for _, obj in batch]
+
+    def flush(self):
+        if not self.batch:
+            return
+        kind, batch = self.batch_type, self.batch
+        self.batch = []
+        try:
+            with transaction.atomic():
+                objects = self.new_objects(kind, batch)
+                if objects:
+                    type(objects[0]).objects.bulk_create(objects)
+        except IntegrityError as error:
+            # Ссылки проверены в new_objects(), но строку могли удалить
+            # параллельно: указываем начало пачки.
+            raise RecordError(batch[0][0],
+                              f'пачка до строки {batch[-1][0]} '
+                              f'не записана ({error})')
+        self.skipped += len(batch) - len(objects)
+        batch = objects
+        if kind == 'user':
+            self.users.update(User.objects
+                              .filter(username__in=[u.username for u in batch])
+                              .values_list('username', 'id'))
+        elif kind == 'group':
+            self.groups.update(Group.objects
+                               .filter(slug__in=[g.slug for g in batch])
+                               .values_list('slug', 'id'))
+        before = self.total
+        self.counts[kind] += len(batch)
+        step = self.progress_every
+        if self.on_progress and before // step != self.total // step:
+            self.on_progress(self.total, self.rate())
@@ -9,6 +9,8 @@ urlpatterns = [
 
     path('group/<slug:slug>/', views.group_posts, name='group'),
 
+    path('search/', views.search, name='search'),
+
     path('follow/',
          views.follow_index,
          name='follow_index'
@@ -33,6 +35,10 @@ urlpatterns = [
         views.post_edit,
         name='post_edit'
         ),
+    path('<str:username>/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'
+         ),
     path('<username>/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'
@@ -1,71 +1,116 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
+from . import thumbnails, timeline
+from .conditional import (anonymous_condition, author_scopes, group_scopes,
+                          post_scopes)
+from .feeds import load_posts
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .paginator import CursorPaginator, paginate
+from .search import SearchResults
+from .streaming import render_feed
 
 
+@anonymous_condition(lambda: ['posts'])
 def index(request):
-    list_of_posts = Post.objects.all()
-    paginator = Paginator(list_of_posts, 15)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    list_of_posts = load_posts(Post.objects.all())
+    page = paginate(request, list_of_posts, 15)
     return render(request, 'index.html', {'page': page,
-                                          'paginator': paginator
+                                          'paginator': page.paginator
                                           })
 
 
+@anonymous_condition(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    list_of_group_posts = group.posts.all()
-    paginator = Paginator(list_of_group_posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'group.html', {'group': group,
-                                          'page': page,
-                                          'paginator': paginator
-                                          }
-                  )
+    list_of_group_posts = load_posts(group.posts.all())
+    page = paginate(request, list_of_group_posts, 10)
+    return render_feed(request, 'group.html', {'group': group,
+                                               'page': page,
+                                               'paginator': page.paginator
+                                               }
+                       )
 
 
+@anonymous_condition(author_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    list_of_author_posts = author.posts.all()
-    paginator = Paginator(list_of_author_posts, 5)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(User.objects.select_related('counters'),
+                               username=username)
+    list_of_author_posts = load_posts(author.posts.all())
+    page = paginate(request, list_of_author_posts, 5)
     following = (request.user.is_authenticated and
                  Follow.objects.filter(author=author,
                                        user=request.user
                                        ).exists())
-    follower_count = Follow.objects.filter(author=author).count()
-    following_count = Follow.objects.filter(user=author).count()
-    return render(request, 'profile.html',
-                  {'author': author,
-                   'page': page,
-                   'paginator': paginator,
-                   'following': following,
-                   'following_count': following_count,
-                   'follower_count': follower_count,
-                   }
-                  )
+    return render_feed(request, 'profile.html',
+                       {'author': author,
+                        'page': page,
+                        'paginator': page.paginator,
+                        'following': following,
+                        }
+                       )
 
 
+@anonymous_condition(post_scopes)
 def post_concrete_view(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id, author__username=username)
+    post = get_object_or_404(
+        load_posts(Post.objects).select_related('author__counters'),
+        id=post_id,
+        author__username=username,
+    )
+    # Страница показывает начало ветки, остальное подгружает post_comments.
+    thread = comment_thread(post)
+    comments = thread.object_list.order_by(*thread.keys)[:thread.per_page]
+    next_comments = None
+    if comments and post.comment_count > len(comments):
+        next_comments = thread.encode_cursor(comments[len(comments) - 1])
     form = CommentForm()
     return render(request, 'post_concrete.html',
                   {
                       'user': request.user,
                       'post': post,
+                      'comments': comments,
+                      'next_comments': next_comments,
                       'form': form,
                   }
                   )
 
 
+def comment_thread(post):
+    return CursorPaginator(post.comments.select_related('author'),
+                           settings.COMMENTS_PER_PAGE,
+                           keys=('created', 'id'), ascending=True)
+
+
+@anonymous_condition(post_scopes)
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев: HTML-фрагмент или ?format=json."""
+    post = get_object_or_404(Post, id=post_id, author__username=username)
+    page = comment_thread(post).get_page(request.GET.get('after'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [{'id': comment.id,
+                          'author': comment.author.username,
+                          'text': comment.text,
+                          'created': comment.created.isoformat()}
+                         for comment in page.object_list],
+            'next': page.next_cursor,
+        })
+    return render(request, 'mini-templates/comment_list.html',
+                  {'post': post,
+                   'comments': page.object_list,
+                   'next_comments': page.next_cursor,
+                   })
+
+
 @login_required(login_url='/auth/login/')
+@transaction.atomic
 def new_post(request):
     form = PostForm()
     if request.method == 'POST':
@@ -74,6 +119,7 @@ def new_post(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            transaction.on_commit(lambda: thumbnails.schedule(post))
             return redirect(reverse('index'))
     return render(request,
                   'post_new_or_edit.html',
@@ -100,7 +146,10 @@ def post_edit(request, username, post_id):
                     instance=post
                     )
     if form.is_valid():
-        post.save()
+        # comment_count меняется параллельно через UPDATE, не затираем его.
+        post.save(update_fields=PostForm.Meta.fields)
+        if 'image' in form.changed_data:
+            transaction.on_commit(lambda: thumbnails.schedule(post))
         return redirect(reverse('post_concrete',
                                 kwargs={
                                     'username': post.author.username,
@@ -116,6 +165,17 @@ def post_edit(request, username, post_id):
                   )
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), 10)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request, 'search.html', {'query': query,
+                                           'page': page,
+                                           'paginator': paginator
+                                           }
+                  )
+
+
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию,
     return render(request, 'misc/404.html', {'path': request.path}, status=404)
@@ -126,6 +186,7 @@ def server_error(request):
 
 
 @login_required(login_url='/auth/login/')
+@transaction.atomic
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, id=post_id, author__username=username)
     form = CommentForm(request.POST or None)
@@ -143,20 +204,20 @@ def add_comment(request, username, post_id):
 
 @login_required
 def follow_index(request):
-    list_of_following = Post.objects.filter(
-        author__following__user=request.user
-    )
-    paginator = Paginator(list_of_following, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'follow.html', {'page': page,
-                                           'paginator': paginator,
-                                           'following_list': list_of_following
-                                           }
-                  )
+    list_of_following = timeline.entries_for(request.user)
+    page = paginate(request, list_of_following, 10,
+                    keys=('pub_date', 'post_id'))
+    page.object_list = [entry.post for entry in page.object_list]
+    return render_feed(request, 'follow.html',
+                       {'page': page,
+                        'paginator': page.paginator,
+                        'following_list': list_of_following
+                        }
+                       )
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -165,6 +226,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if Follow.objects.filter(user=request.user, author=author).exists():
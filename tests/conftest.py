@@ -1,4 +1,14 @@
+import pytest
+from yatube.test_runner import isolated_cache
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def test_cache(tmp_path_factory):
+    # Не трогаем общий cache.sqlite3 (см. yatube.test_runner).
+    with isolated_cache(str(tmp_path_factory.mktemp('cache'))):
+        yield
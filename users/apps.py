@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        from . import reserved, signals  # noqa: F401
+        checks.register(reserved.check_usernames, checks.Tags.database)
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY, load_backend)
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import snapshots
+
+
+def get_user(request):
+    """
+    То же, что django.contrib.auth.get_user, но пользователь берётся
+    из снимка в кэше (users.snapshots), а не из базы.
+    """
+    try:
+        user_id = snapshots.User._meta.pk.to_python(
+            request.session[SESSION_KEY]
+        )
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    user = snapshots.load(user_id, load_backend(backend_path))
+    if user is None:
+        return AnonymousUser()
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(
+            session_hash, user.get_session_auth_hash())):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+class SnapshotAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware, которой не нужен запрос к auth_user."""
+
+    def process_request(self, request):
+        # Родитель проверяет, что SessionMiddleware подключена раньше.
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
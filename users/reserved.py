@@ -0,0 +1,38 @@
+"""
+Имена пользователей, занятые адресами сайта.
+
+Профиль живёт по адресу /<username>/, а маршруты с постоянным первым
+сегментом (/search/, /follow/ и т. д.) стоят в URLconf раньше него.
+Пользователь с таким именем потерял бы профиль, подписку и страницы
+постов, поэтому форма регистрации эти имена не принимает, а проверка
+check_usernames (manage.py check --tag database) находит уже занятые.
+"""
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.exceptions import ValidationError
+
+RESERVED_USERNAMES = frozenset({
+    'about', 'about-us', 'admin', 'api', 'auth', 'follow', 'group',
+    'media', 'metrics', 'new', 'search', 'static', 'terms',
+})
+
+
+def validate_username(username):
+    if username in RESERVED_USERNAMES:
+        raise ValidationError('Это имя занято адресом сайта.',
+                              code='reserved')
+
+
+def check_usernames(app_configs, **kwargs):
+    """Системная проверка: ни у кого нет зарезервированного имени."""
+    taken = (get_user_model().objects
+             .filter(username__in=RESERVED_USERNAMES)
+             .values_list('username', flat=True))
+    return [
+        checks.Warning(
+            f'Профиль пользователя {username} закрыт маршрутом '
+            f'/{username}/: переименуйте пользователя',
+            id='users.W001',
+        )
+        for username in taken
+    ]
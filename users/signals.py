@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import snapshots
+
+
+@receiver(post_save, sender=snapshots.User)
+@receiver(post_delete, sender=snapshots.User)
+def invalidate_snapshot(sender, instance, update_fields=None, **kwargs):
+    # Вход в систему сохраняет только last_login, которого нет в снимке.
+    if update_fields == frozenset(['last_login']):
+        return
+    snapshots.invalidate(instance.pk)
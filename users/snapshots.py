@@ -0,0 +1,127 @@
+"""
+Короткий снимок вошедшего пользователя в общем кэше.
+
+Чтобы нарисовать шапку страницы и проверить права, большинству
+представлений хватает id, имени и флагов пользователя. Снимок с этими
+полями и хэшем для проверки сессии лежит в кэше под user-snapshot:<id>,
+поэтому запрос вошедшего пользователя не читает строку auth_user.
+Полный объект User загружается из базы при первом обращении к любому
+другому атрибуту. Снимок удаляют обработчики сигналов в users.signals.
+
+Снимок хранит флаги прав и хэш сессии, а QuerySet.update() и правки
+в обход ORM сигналов не посылают. Поэтому USER_SNAPSHOT_TIMEOUT —
+секунды: дольше него отключённый пользователь или сменённый пароль
+не продержатся.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.base import ModelState
+from django.utils.functional import LazyObject, empty
+
+User = get_user_model()
+
+FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def snapshot_key(user_id):
+    return f'user-snapshot:{user_id}'
+
+
+def make_snapshot(user):
+    snapshot = {field: getattr(user, field) for field in FIELDS}
+    snapshot['auth_hash'] = user.get_session_auth_hash()
+    return snapshot
+
+
+def load(user_id, backend):
+    """SnapshotUser из кэша или, при промахе, из backend.get_user()."""
+    snapshot = cache.get(snapshot_key(user_id))
+    if snapshot is not None:
+        return SnapshotUser(snapshot)
+    user = backend.get_user(user_id)
+    if user is None:
+        return None
+    cache.set(snapshot_key(user_id), make_snapshot(user),
+              settings.USER_SNAPSHOT_TIMEOUT)
+    return SnapshotUser(make_snapshot(user), user)
+
+
+def invalidate(user_id):
+    cache.delete(snapshot_key(user_id))
+
+
+class SnapshotUser(LazyObject):
+    """
+    Ведёт себя как User: проходит isinstance, сравнивается с User по pk
+    и годится как значение внешнего ключа. Поля снимка отдаются без
+    запросов, остальное — из загруженного при первом обращении объекта.
+    """
+    _meta = User._meta
+
+    def __init__(self, snapshot, user=None):
+        self.__dict__['_snapshot'] = snapshot
+        super().__init__()
+        if user is not None:
+            self._wrapped = user
+
+    def _setup(self):
+        self._wrapped = User._default_manager.get(pk=self._snapshot['id'])
+
+    @property
+    def hydrated(self):
+        return self._wrapped is not empty
+
+    def __getattr__(self, name):
+        if not self.hydrated:
+            if name in FIELDS:
+                return self._snapshot[name]
+            if name == 'pk':
+                return self._snapshot['id']
+            if name == '_state':
+                # Строка уже есть в базе: присваивание внешнему ключу
+                # не должно загружать пользователя ради _state.db.
+                state = ModelState()
+                state.db = DEFAULT_DB_ALIAS
+                state.adding = False
+                self.__dict__['_state'] = state
+                return state
+        return super().__getattr__(name)
+
+    @property
+    def __class__(self):
+        return User
+
+    is_anonymous = False
+    is_authenticated = True
+
+    def get_username(self):
+        return self.username
+
+    def get_session_auth_hash(self):
+        # После загрузки пароль мог смениться (PasswordChangeView сначала
+        # сохраняет пользователя, затем обновляет хэш сессии).
+        if self.hydrated:
+            return self._wrapped.get_session_auth_hash()
+        return self._snapshot['auth_hash']
+
+    def __str__(self):
+        return self.get_username()
+
+    def __getitem__(self, key):
+        # Шаблоны сначала пробуют user[...]: у модели индексации нет,
+        # и загружать ради этого пользователя незачем.
+        raise TypeError(f'{type(self).__name__} is not subscriptable')
+
+    def __eq__(self, other):
+        if not isinstance(other, User):
+            return NotImplemented
+        return self.pk == other.pk
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self.pk)
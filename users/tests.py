@@ -1,3 +1,151 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from posts.models import Follow, Post
+
+from users import reserved, snapshots
+from users.forms import CreationForm
+
+User = get_user_model()
+
+STOCK_MIDDLEWARE = [
+    'django.contrib.auth.middleware.AuthenticationMiddleware'
+    if name == 'users.middleware.SnapshotAuthenticationMiddleware' else name
+    for name in settings.MIDDLEWARE
+]
+
+
+class SnapshotUserTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='Snap', email='snap@example.com', password='pass-1234')
+        self.author = User.objects.create_user(username='Author')
+        self.client.force_login(self.user)
+
+    def cached_user(self):
+        snapshots.load(self.user.pk, ModelBackend())
+        return snapshots.load(self.user.pk, ModelBackend())
+
+    def queries_for(self, url):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_request_reads_neither_session_nor_user(self):
+        queries = self.queries_for(reverse('new_post'))
+        self.assertFalse([sql for sql in queries
+                          if 'django_session' in sql
+                          or 'FROM "auth_user"' in sql], queries)
+
+    def test_saved_queries_per_request(self):
+        url = reverse('new_post')
+        snapshot = len(self.queries_for(url))
+        with self.settings(MIDDLEWARE=STOCK_MIDDLEWARE,
+                           SESSION_ENGINE='django.contrib.sessions'
+                                          '.backends.db'):
+            # Клиент собирает цепочку middleware один раз.
+            self.client = self.client_class()
+            self.client.force_login(self.user)
+            stock = len(self.queries_for(url))
+        # Запрос сессии и запрос пользователя.
+        self.assertEqual(stock - snapshot, 2)
+
+    def test_snapshot_fields_need_no_queries(self):
+        user = self.cached_user()
+        with self.assertNumQueries(0):
+            self.assertEqual(user.username, 'Snap')
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertTrue(user.is_authenticated)
+            self.assertIsInstance(user, User)
+            self.assertEqual(user, self.user)
+            self.assertNotEqual(user, self.author)
+            Follow(user=user, author=self.author)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'snap@example.com')
+
+    def test_snapshot_as_foreign_key(self):
+        user = self.cached_user()
+        post = Post.objects.create(text='Из снимка', author=user)
+        self.assertEqual(Post.objects.get(pk=post.pk).author, self.user)
+
+    def test_changes_invalidate_snapshot(self):
+        self.client.get(reverse('index'))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('new_post'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_update_without_signals_expires_with_snapshot(self):
+        # Снимок не знает об update(): его срок и есть задержка отзыва.
+        self.assertLessEqual(settings.USER_SNAPSHOT_TIMEOUT, 60)
+        changes = {'is_active': False, 'password': make_password('other')}
+        for field, value in changes.items():
+            with self.subTest(field=field):
+                cache.clear()
+                self.client.force_login(self.user)
+                self.client.get(reverse('new_post'))
+                User.objects.filter(pk=self.user.pk).update(**{field: value})
+                expired = time.time() + settings.USER_SNAPSHOT_TIMEOUT + 1
+                with mock.patch('yatube.cache_backends.time') as clock:
+                    clock.time.return_value = expired
+                    response = self.client.get(reverse('new_post'))
+                self.assertEqual(response.status_code, 302)
+                User.objects.filter(pk=self.user.pk).update(
+                    is_active=True, password=self.user.password)
+
+    def test_password_change_keeps_own_session(self):
+        other = self.client_class()
+        other.force_login(self.user)
+        response = self.client.post(reverse('password_change'), {
+            'old_password': 'pass-1234',
+            'new_password1': 'new-pass-5678',
+            'new_password2': 'new-pass-5678',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            self.client.get(reverse('new_post')).status_code, 200)
+        self.assertEqual(other.get(reverse('new_post')).status_code, 302)
+
+
+class ReservedUsernameTest(TestCase):
+    def signup(self, username):
+        return CreationForm({'username': username, 'password1': 'pass-1234x',
+                             'password2': 'pass-1234x'})
+
+    def test_signup_rejects_route_names(self):
+        for username in ('search', 'metrics', 'api'):
+            self.assertIn('username', self.signup(username).errors)
+        self.assertTrue(self.signup('searcher').is_valid())
+
+    def test_every_root_route_is_reserved(self):
+        def segments(patterns):
+            for pattern in patterns:
+                route = str(pattern.pattern).lstrip('^')
+                if not route:
+                    # include() без префикса, как posts.urls.
+                    yield from segments(getattr(pattern, 'url_patterns', []))
+                    continue
+                segment = route.split('/')[0]
+                if segment and not set('<(').intersection(segment):
+                    yield segment
+
+        self.assertLessEqual(set(segments(get_resolver().url_patterns)),
+                             reserved.RESERVED_USERNAMES)
 
-# Create your tests here.
+    def test_database_check_finds_taken_names(self):
+        self.assertEqual(reserved.check_usernames(None), [])
+        User.objects.create_user(username='search')
+        problems = reserved.check_usernames(None)
+        self.assertEqual([problem.id for problem in problems], ['users.W001'])
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+from django.core import checks
+
+
+class YatubeConfig(AppConfig):
+    name = 'yatube'
+
+    def ready(self):
+        from . import db, media  # noqa: F401
+        checks.register(media.check_sendfile_backend)
@@ -0,0 +1,177 @@
+"""
+Кэш в файле SQLite, общий для всех процессов-воркеров на одной машине.
+
+Интерфейс — стандартный BaseCache, поэтому бэкенд взаимозаменяем с
+memcached/redis: код приложения пользуется только get/set/add/incr/delete.
+add() и incr() атомарны между процессами (BEGIN IMMEDIATE), на этом
+построены блокировки в posts.caching.get_or_compute.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._cull_every = params.get('OPTIONS', {}).get('CULL_EVERY', 100)
+        self._writes = 0
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # Соединение SQLite нельзя переносить через fork: воркер, которого
+        # форкнули после прогрева (yatube.warmup), открывает своё.
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _expiry(self, timeout):
+        expiry = self.get_backend_timeout(timeout)
+        return float('inf') if expiry is None else expiry
+
+    def _write(self, sql, params):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = connection.execute(sql, params)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self._writes += 1
+        if self._writes % self._cull_every == 0:
+            self._cull()
+        return cursor.rowcount
+
+    def _cull(self):
+        connection = self._connection
+        connection.execute('DELETE FROM cache WHERE expires <= ?',
+                           (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            excess = count - self._max_entries
+            if self._cull_frequency:
+                excess = max(excess, count // self._cull_frequency)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY expires LIMIT ?)',
+                (excess,),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection.execute(
+            'SELECT value FROM cache WHERE key = ? AND expires > ?',
+            (key, time.time()),
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        rows = self._connection.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            f'AND expires > ?',
+            (*keys, time.time()),
+        )
+        return {keys[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, self.pickle_protocol),
+             self._expiry(timeout)),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self._write(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires <= ?',
+            (key, pickle.dumps(value, self.pickle_protocol),
+             self._expiry(timeout), time.time()),
+        ))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self._write(
+            'UPDATE cache SET expires = ? WHERE key = ? AND expires > ?',
+            (self._expiry(timeout), key, time.time()),
+        ))
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? AND expires > ?',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, self.pickle_protocol), key),
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND expires > ?',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def clear(self):
+        self._write('DELETE FROM cache', ())
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время работы потока, как и у бэкенда locmem.
+        pass
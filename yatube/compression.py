@@ -0,0 +1,166 @@
+"""
+Сжатие ответов: brotli, если установлен пакет brotli и клиент его
+принимает, иначе gzip.
+
+Сжимаются текстовые типы не короче COMPRESSION_MIN_SIZE байт. Потоковые
+ответы сжимаются по частям со сбросом буфера после каждой, чтобы начало
+страницы уходило клиенту сразу. Файлы статики заранее сжимает команда
+compress_static, готовые .br/.gz отдаёт yatube.media.serve — middleware
+их не трогает (FileResponse пропускается).
+"""
+import gzip
+import mimetypes
+import os
+import zlib
+from functools import partial
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript',
+                      'application/xml', 'image/svg+xml')
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def compressible(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding с q > 0, brotli впереди gzip."""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return [coding for coding in SUFFIXES if coding in accepted]
+
+
+def choose_encoding(request):
+    for coding in accepted_encodings(request):
+        if coding == 'gzip' or brotli is not None:
+            return coding
+    return None
+
+
+def compress(data, coding, best=False):
+    if coding == 'br':
+        return brotli.compress(
+            data, quality=11 if best else settings.COMPRESSION_BROTLI_QUALITY
+        )
+    return gzip.compress(
+        data, compresslevel=9 if best else settings.COMPRESSION_GZIP_LEVEL,
+        mtime=0,
+    )
+
+
+def compress_chunks(chunks, coding):
+    if coding == 'br':
+        compressor = brotli.Compressor(
+            quality=settings.COMPRESSION_BROTLI_QUALITY,
+        )
+        process, flush = compressor.process, compressor.flush
+        finish = compressor.finish
+    else:
+        compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL,
+                                      zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process = compressor.compress
+        flush = partial(compressor.flush, zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+    for chunk in chunks:
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def precompressed(request, path):
+    """(файл, кодировка) готового сжатого варианта path или None."""
+    for coding in accepted_encodings(request):
+        candidate = path + SUFFIXES[coding]
+        if os.path.isfile(candidate):
+            return candidate, coding
+    return None
+
+
+def precompress(root, min_size):
+    """
+    Пишет рядом с текстовыми файлами root варианты .gz и (с пакетом
+    brotli) .br с наилучшим сжатием. Возвращает (путь, кодировка, размер,
+    сжатый размер) для каждого записанного варианта; свежие варианты
+    и варианты, которые не меньше оригинала, пропускаются.
+    """
+    codings = ['gzip'] + (['br'] if brotli is not None else [])
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            content_type, encoding = mimetypes.guess_type(path)
+            if encoding or not compressible(content_type):
+                continue
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+            data = None
+            for coding in codings:
+                target = path + SUFFIXES[coding]
+                if (os.path.exists(target)
+                        and os.stat(target).st_mtime >= stat.st_mtime):
+                    continue
+                if data is None:
+                    with open(path, 'rb') as source:
+                        data = source.read()
+                compressed = compress(data, coding, best=True)
+                if len(compressed) >= len(data):
+                    continue
+                with open(target, 'wb') as variant:
+                    variant.write(compressed)
+                yield path, coding, len(data), len(compressed)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if (response.has_header('Content-Encoding')
+                or response.status_code in (206, 304)
+                or isinstance(response, FileResponse)
+                or not compressible(response.get('Content-Type'))):
+            return response
+        if (not response.streaming
+                and len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = choose_encoding(request)
+        if coding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_chunks(
+                response.streaming_content, coding,
+            )
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Сжатое тело отличается побайтно, но не по смыслу.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
@@ -0,0 +1,57 @@
+"""
+Настройка подключений к SQLite и маршрутизация чтения на реплику.
+
+tune_sqlite() выполняет PRAGMA из SQLITE_PRAGMAS для каждого нового
+подключения (сигнал connection_created). WAL позволяет читателям не ждать
+пишущего, busy_timeout заставляет пишущих ждать очереди, а не падать
+с «database is locked».
+
+ReplicaRouter включается переменной окружения YATUBE_DB_REPLICA=1:
+чтение моделей из DATABASE_REPLICA_APPS идёт через подключение replica,
+запись и чтение внутри транзакций — через default.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+REPLICA_DB_ALIAS = 'replica'
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+
+
+def pragmas(connection):
+    """Текущие значения SQLITE_PRAGMAS подключения."""
+    with connection.cursor() as cursor:
+        values = {}
+        for name in settings.SQLITE_PRAGMAS:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in settings.DATABASE_REPLICA_APPS:
+            return None
+        # Внутри транзакции читаем то, что только что записали.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия default, объекты из обеих баз связаны.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
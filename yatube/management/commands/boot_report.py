@@ -0,0 +1,67 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube import warmup
+
+
+class Command(BaseCommand):
+    help = ('Запускает yatube.wsgi в отдельном процессе с -X importtime и '
+            'показывает время старта воркера: самые долгие импорты, '
+            'пакеты и шаги прогрева (yatube.warmup). С --budget-ms '
+            'завершается ошибкой, если старт дольше бюджета.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warmup', dest='mode',
+                            choices=list(warmup.MODES),
+                            default=settings.WARMUP)
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--budget-ms', type=float)
+        parser.add_argument(
+            '--output', default='-',
+            help="Куда записать отчёт, '-' — только вывести таблицы.",
+        )
+
+    def handle(self, *args, mode, top, budget_ms, output, **options):
+        try:
+            boot_ms, warmup_ms, imports = warmup.measure_boot(mode)
+        except subprocess.CalledProcessError as exc:
+            raise CommandError('yatube.wsgi не запустился:\n' + exc.stderr)
+        import_ms = sum(item.self_ms for item in imports)
+        packages = warmup.by_package(imports)
+
+        self.stdout.write(f'Старт ({mode}): {boot_ms:.1f} мс, из них импорт '
+                          f'{import_ms:.1f} мс, {len(imports)} модулей')
+        for step, elapsed in warmup_ms.items():
+            self.stdout.write(f'  прогрев {step:<12}{elapsed:>9.1f} мс')
+
+        self.stdout.write(f'\n{"пакет":<32}{"мс":>9}')
+        for name, elapsed in packages.most_common(top):
+            self.stdout.write(f'{name:<32}{elapsed:>9.1f}')
+
+        self.stdout.write(f'\n{"модуль":<48}{"свои мс":>9}{"всего мс":>9}')
+        slowest = sorted(imports, key=lambda item: item.self_ms,
+                         reverse=True)
+        for item in slowest[:top]:
+            self.stdout.write(f'{item.name:<48}{item.self_ms:>9.1f}'
+                              f'{item.cumulative_ms:>9.1f}')
+
+        if output != '-':
+            report = {
+                'warmup': mode,
+                'boot_ms': round(boot_ms, 1),
+                'import_ms': round(import_ms, 1),
+                'warmup_ms': warmup_ms,
+                'packages': {name: round(elapsed, 2)
+                             for name, elapsed in packages.most_common()},
+                'imports': [item._asdict() for item in imports],
+            }
+            with open(output, 'w', encoding='utf-8') as report_file:
+                json.dump(report, report_file, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Отчёт записан в {output}'))
+
+        if budget_ms is not None and boot_ms > budget_ms:
+            raise CommandError(f'Старт {boot_ms:.1f} мс дольше бюджета '
+                               f'{budget_ms:.0f} мс')
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from yatube import compression
+
+
+class Command(BaseCommand):
+    help = ('Сжимает текстовые файлы STATIC_ROOT в варианты .gz и, если '
+            'установлен brotli, .br; yatube.media отдаёт их клиентам, '
+            'которые принимают сжатие. Запускайте после collectstatic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=settings.STATIC_ROOT)
+        parser.add_argument('--min-size', type=int,
+                            default=settings.COMPRESSION_MIN_SIZE)
+
+    def handle(self, *args, root, min_size, **options):
+        written = original = compressed = 0
+        for path, coding, size, compressed_size in compression.precompress(
+                root, min_size):
+            written += 1
+            original += size
+            compressed += compressed_size
+            self.stdout.write(f'{path}: {coding} {size} -> {compressed_size}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Вариантов записано: {written}, {original} -> {compressed} байт'
+        ))
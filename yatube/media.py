@@ -0,0 +1,186 @@
+"""
+Отдача файлов из MEDIA_ROOT и STATIC_ROOT.
+
+В отличие от django.views.static.serve поддерживает условные запросы
+(ETag/Last-Modified -> 304), HTTP Range, долгий Cache-Control для имён
+с хэшем содержимого и передачу файла фронтенд-серверу через X-Sendfile
+или X-Accel-Redirect (SENDFILE_BACKEND). Без фронтенда файл читается
+большими блоками через FileResponse. Клиенту, который принимает сжатие,
+отдаётся готовый вариант .br/.gz, если его создала команда compress_static.
+Неизвестный SENDFILE_BACKEND ловит системная проверка
+check_sendfile_backend.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import (ImproperlyConfigured,
+                                    SuspiciousFileOperation)
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from . import compression
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+HASHED_NAME_RE = re.compile(r'(^|[./])[0-9a-f]{12,}\.[^./]+$')
+
+BLOCK_SIZE = 512 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+SENDFILE_BACKENDS = ('x-sendfile', 'x-accel-redirect')
+
+
+def check_sendfile_backend(app_configs, **kwargs):
+    """
+    Системная проверка: с неизвестным SENDFILE_BACKEND файлы уходили бы
+    пустыми ответами 200 без заголовка для фронтенда.
+    """
+    backend = settings.SENDFILE_BACKEND
+    if backend and backend not in SENDFILE_BACKENDS:
+        return [checks.Error(
+            f'Неизвестный SENDFILE_BACKEND {backend!r}',
+            hint=f'Допустимы None и {", ".join(SENDFILE_BACKENDS)}',
+            id='yatube.E001',
+        )]
+    return []
+
+
+def _cache_control(path):
+    if HASHED_NAME_RE.search(os.path.basename(path)):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def _parse_range(header, size):
+    """(start, end) включительно, None для всего файла, False — 416."""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _sendfile(response, path, url_path, accel_prefix):
+    backend = settings.SENDFILE_BACKEND
+    if backend == 'x-sendfile':
+        response['X-Sendfile'] = path
+    elif backend == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = accel_prefix + url_path
+    else:
+        raise ImproperlyConfigured(
+            f'Неизвестный SENDFILE_BACKEND {backend!r}')
+    return response
+
+
+def serve(request, path, document_root, accel_prefix=''):
+    try:
+        fullpath = safe_join(document_root, path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404('Файл не найден')
+    try:
+        stat = os.stat(fullpath)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('Файл не найден')
+    if not os.path.isfile(fullpath):
+        raise Http404('Файл не найден')
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+    cache_control = _cache_control(fullpath)
+    vary = None
+    if not encoding and compression.compressible(content_type):
+        vary = 'Accept-Encoding'
+        # Диапазоны относятся к исходному файлу.
+        variant = (None if request.META.get('HTTP_RANGE')
+                   else compression.precompressed(request, fullpath))
+        if variant is not None:
+            fullpath, encoding = variant
+            path += compression.SUFFIXES[encoding]
+            stat = os.stat(fullpath)
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = http_date(stat.st_mtime)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+    if vary:
+        headers['Vary'] = vary
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime),
+    )
+    if conditional is not None:
+        for name, value in headers.items():
+            conditional[name] = value
+        return conditional
+
+    if settings.SENDFILE_BACKEND:
+        # Диапазоны и отдачу тела берёт на себя фронтенд-сервер.
+        response = HttpResponse(content_type=content_type)
+        response = _sendfile(response, fullpath, path, accel_prefix)
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and _if_range_matches(request, etag, stat.st_mtime):
+            byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(fullpath, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(open(fullpath, 'rb'),
+                                    content_type=content_type)
+            response.block_size = BLOCK_SIZE
+            response['Content-Length'] = stat.st_size
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
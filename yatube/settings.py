@@ -26,34 +26,57 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    "debug_toolbar",
+    'perf',
+    'yatube',
 ]
 
 MIDDLEWARE = [
+    'perf.middleware.PerformanceMiddleware',
+    'yatube.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # 'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.SnapshotAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+# debug_toolbar только для разработки: в бою он замедляет каждый запрос.
+if DEBUG:
+    INSTALLED_APPS += ["debug_toolbar"]
+    MIDDLEWARE += ["debug_toolbar.middleware.DebugToolbarMiddleware"]
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Загрузчики шаблонов заданы явно: в бою скомпилированные шаблоны хранит
+# cached.Loader, а при прогреве воркера (yatube.warmup)
+# perf.templates.preload компилирует их все заранее.
+# TEMPLATE_INLINE_INCLUDES встраивает постоянные {% include %} внутри
+# циклов в сам цикл.
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+TEMPLATE_PRELOAD = not DEBUG
+TEMPLATE_INLINE_INCLUDES = os.environ.get('YATUBE_INLINE_INCLUDES') == '1'
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'perf.templates.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -67,13 +90,42 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Подключения живут CONN_MAX_AGE секунд и переиспользуются между
+# запросами. PRAGMA из SQLITE_PRAGMAS выполняются для каждого нового
+# подключения (yatube.db.tune_sqlite): WAL — читатели не ждут пишущего,
+# busy_timeout — пишущие ждут очереди до 5 секунд вместо ошибки.
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get(
+            'YATUBE_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 600)),
     }
 }
 
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # в КиБ
+    'busy_timeout': 5000,  # мс
+}
+
+# Реплика для чтения (yatube.db.ReplicaRouter): по умолчанию отдельное
+# подключение к тому же файлу, YATUBE_DB_REPLICA_NAME — копия базы.
+
+if os.environ.get('YATUBE_DB_REPLICA') == '1':
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.environ.get('YATUBE_DB_REPLICA_NAME',
+                            DATABASES['default']['NAME']),
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_ROUTERS = ['yatube.db.ReplicaRouter']
+DATABASE_REPLICA_APPS = ['posts']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,6 +157,38 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Отдача файлов (yatube.media): файлы без хэша в имени кэшируются
+# на MEDIA_MAX_AGE секунд. SENDFILE_BACKEND: None, 'x-sendfile' (Apache,
+# lighttpd) или 'x-accel-redirect' (nginx, internal-локации
+# /internal/media/ и /internal/static/).
+
+MEDIA_MAX_AGE = 60 * 60
+SENDFILE_BACKEND = os.environ.get('YATUBE_SENDFILE_BACKEND') or None
+
+# Баннеры страниц: исходник в MEDIA_ROOT и размер. Варианты с хэшем
+# в имени создаёт команда build_banners в STATIC_ROOT/banners.
+
+BANNER_IMAGES = {
+    'index': ('tests/MilkyWay.jpg', '1920x1080'),
+    'group': ('tests/kosmo_profile.jpg', '2500x860'),
+    'profile': ('tests/matrix.jpg', '3000x1360'),
+    'follow': ('tests/LtW_Products_Subscription1.jpg', '1500x860'),
+}
+
+# Сессии читаются из кэша и записываются в базу (cached_db). Пользователь
+# запроса — снимок из кэша (users.snapshots), полный объект загружается,
+# только когда представлению нужно что-то кроме id, имени и флагов.
+# Снимок живёт USER_SNAPSHOT_TIMEOUT секунд: изменения в обход сигналов
+# (QuerySet.update(), правки прямо в базе) — отключение учётной записи,
+# смена прав или пароля — вступают в силу не позже чем через столько.
+# 'django.contrib.sessions.backends.signed_cookies' обходится без хранилища,
+# но такую сессию нельзя отозвать на сервере.
+
+SESSION_ENGINE = os.environ.get(
+    'YATUBE_SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db'
+)
+USER_SNAPSHOT_TIMEOUT = 30
+
 # Login
 
 LOGIN_URL = "/auth/login/"
@@ -121,8 +205,130 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 SITE_ID = 1
 
+# Кэш общий для всех воркеров на машине. Для нескольких машин достаточно
+# указать бэкенд memcached/redis: приложению нужен только интерфейс BaseCache.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.environ.get(
+            'YATUBE_CACHE_BACKEND', 'yatube.cache_backends.SQLiteCache'
+        ),
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+
+# Тесты получают свой кэш во временном каталоге (yatube.test_runner).
+
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
+
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Комментарии на странице поста: столько же подгружает каждая порция.
+
+COMMENTS_PER_PAGE = 50
+
+# Сжатие ответов (yatube.compression): gzip или brotli, если установлен
+# пакет brotli. Статику заранее сжимает команда compress_static.
+
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Потоковый рендер лент group, profile и follow (posts.streaming):
+# шапка страницы уходит клиенту до рендера карточек.
+
+STREAMING_FEEDS = os.environ.get('YATUBE_STREAMING') == '1'
+
+# Прогрев воркера при старте (yatube.warmup): off — быстрый старт без
+# прогрева, preload — URLconf, шаблоны, модели и sorl, full — ещё
+# подключение к базе и WARMUP_REQUESTS запросов к index и profile.
+# full включается явно (YATUBE_WARMUP=full): синтетические запросы
+# идут при каждом старте воркера и нагружают базу.
+# Время импорта и прогрева показывает команда boot_report.
+
+WARMUP = os.environ.get('YATUBE_WARMUP', 'preload')
+WARMUP_REQUESTS = 2
+
+# JSON API лент /api/v1/ (posts.api).
+
+API_PAGE_SIZE = 20
+
+# Страницы для анонимных читателей (posts.conditional): общие кэши хранят
+# их PAGE_SHARED_MAX_AGE секунд. RELEASE входит в ETag — задайте его при
+# выкладке, чтобы новые шаблоны и статика не отдавались как 304.
+
+PAGE_SHARED_MAX_AGE = 30
+RELEASE = os.environ.get('YATUBE_RELEASE', '')
+
+# Кэш целых страниц для анонимных читателей (posts.pagecache),
+# включается переменной окружения YATUBE_PAGE_CACHE=1.
+
+PAGE_CACHE_ENABLED = os.environ.get('YATUBE_PAGE_CACHE') == '1'
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Миниатюры создаются фоновым пулом: 'process', 'thread' или 'sync'.
+# По умолчанию 'sync' — на месте, после коммита: пулу нужны отдельные
+# процессы с доступом к той же базе, а тестовый клиент и manage.py shell
+# их не дают. На сервере задайте YATUBE_THUMBNAIL_EXECUTOR=process.
+
+THUMBNAIL_EXECUTOR = os.environ.get('YATUBE_THUMBNAIL_EXECUTOR', 'sync')
+THUMBNAIL_WORKERS = 2
+
+# Лента подписок
+
+TIMELINE_LENGTH = 800
+TIMELINE_BATCH_SIZE = 500
+
+# Замеры запросов (perf): заголовок Server-Timing и /metrics/ для Prometheus.
+# Кроме staff метрики доступны с заголовком Authorization: Bearer <токен>.
+# Server-Timing видят все клиенты, поэтому он включается явно
+# (YATUBE_SERVER_TIMING=1); команды benchmark включают его сами.
+
+PERF_SERVER_TIMING = os.environ.get('YATUBE_SERVER_TIMING') == '1'
+PERF_METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
+# Журнал повторяющихся и медленных запросов (perf.querylog) для доли
+# PERF_QUERY_LOG_SAMPLE_RATE запросов; 0 — выключен. Строки JSON пишутся
+# в логгер perf.queries, по умолчанию в файл PERF_QUERY_LOG_FILE.
+
+PERF_QUERY_LOG_SAMPLE_RATE = float(
+    os.environ.get('YATUBE_QUERY_LOG_SAMPLE_RATE', 0)
+)
+PERF_DUPLICATE_QUERY_THRESHOLD = 5
+PERF_SLOW_QUERY_MS = 100
+PERF_QUERY_LOG_FILE = os.path.join(BASE_DIR, 'logs', 'queries.jsonl')
+
+# Профилировщик /metrics/profile/ (perf.profiler), по умолчанию выключен.
+# Сеанс не длиннее PERF_PROFILER_MAX_SECONDS, снятие стеков занимает
+# не больше доли PERF_PROFILER_MAX_OVERHEAD времени процесса.
+
+PERF_PROFILER_ENABLED = os.environ.get('YATUBE_PROFILER') == '1'
+PERF_PROFILER_INTERVAL = 0.01
+PERF_PROFILER_MAX_SECONDS = 60
+PERF_PROFILER_MAX_OVERHEAD = 0.02
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'query_log': {
+            'class': 'perf.querylog.QueryLogFileHandler',
+            'filename': PERF_QUERY_LOG_FILE,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'perf.queries': {
+            'handlers': ['query_log'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,34 @@
+"""
+Тесты работают со своим кэшем во временном каталоге: cache.clear()
+в тестах не должен стирать общий cache.sqlite3 разработчика или сервера,
+а тесты — зависеть от его содержимого.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def isolated_cache(directory):
+    """override_settings с CACHES, указывающими на SQLite-файлы в directory."""
+    return override_settings(CACHES={
+        alias: dict(config,
+                    BACKEND='yatube.cache_backends.SQLiteCache',
+                    LOCATION=os.path.join(directory, f'{alias}.sqlite3'))
+        for alias, config in settings.CACHES.items()
+    })
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_directory = tempfile.TemporaryDirectory()
+        self._cache_settings = isolated_cache(self._cache_directory.name)
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        self._cache_directory.cleanup()
+        super().teardown_test_environment(**kwargs)
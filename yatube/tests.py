@@ -0,0 +1,360 @@
+import gzip
+import os
+import tempfile
+import threading
+import zlib
+from io import StringIO
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.template import Engine
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from perf import metrics, templates
+from posts.models import Post
+
+from yatube import compression, db, media, warmup
+from yatube.media import serve
+
+
+class MediaServeTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = bytes(range(256)) * 4
+        for name in ('plain.bin', 'banner.0123456789ab.jpg'):
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(self.content)
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get(self, path, **headers):
+        request = self.factory.get(f'/media/{path}', **headers)
+        return serve(request, path, document_root=self.root,
+                     accel_prefix='/internal/media/')
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_response_with_validators(self):
+        response = self.get('plain.bin')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_conditional_requests_return_304(self):
+        first = self.get('plain.bin')
+        by_etag = self.get('plain.bin', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(by_etag.status_code, 304)
+        by_date = self.get('plain.bin',
+                           HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_ranges(self):
+        response = self.get('plain.bin', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.content[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+
+        suffix = self.get('plain.bin', HTTP_RANGE='bytes=-4')
+        self.assertEqual(self.body(suffix), self.content[-4:])
+
+        outside = self.get('plain.bin', HTTP_RANGE='bytes=5000-')
+        self.assertEqual(outside.status_code, 416)
+        self.assertEqual(outside['Content-Range'], 'bytes */1024')
+
+        stale = self.get('plain.bin', HTTP_RANGE='bytes=0-1',
+                         HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_cache_control_depends_on_hashed_name(self):
+        self.assertIn('immutable',
+                      self.get('banner.0123456789ab.jpg')['Cache-Control'])
+        self.assertNotIn('immutable', self.get('plain.bin')['Cache-Control'])
+
+    def test_precompressed_variants(self):
+        css = b'.card { margin: 0 auto; }\n' * 100
+        with open(os.path.join(self.root, 'site.css'), 'wb') as file:
+            file.write(css)
+        call_command('compress_static', root=self.root, stdout=StringIO())
+        self.assertTrue(os.path.exists(
+            os.path.join(self.root, 'site.css.gz')))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'plain.bin.gz')))
+
+        response = self.get('site.css', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(self.body(response)), css)
+
+        identity = self.get('site.css')
+        self.assertFalse(identity.has_header('Content-Encoding'))
+        self.assertNotEqual(identity['ETag'], response['ETag'])
+        ranged = self.get('site.css', HTTP_ACCEPT_ENCODING='gzip',
+                          HTTP_RANGE='bytes=0-9')
+        self.assertEqual(self.body(ranged), css[:10])
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect')
+    def test_accel_redirect_offload(self):
+        response = self.get('plain.bin')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/internal/media/plain.bin')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(SENDFILE_BACKEND='x-sendfile')
+    def test_sendfile_offload(self):
+        response = self.get('plain.bin')
+        self.assertEqual(response['X-Sendfile'],
+                         os.path.join(self.root, 'plain.bin'))
+
+    @override_settings(SENDFILE_BACKEND='x-accel')
+    def test_unknown_sendfile_backend_is_an_error(self):
+        self.assertEqual(
+            [error.id for error in media.check_sendfile_backend(None)],
+            ['yatube.E001'])
+        with self.assertRaises(ImproperlyConfigured):
+            self.get('plain.bin')
+
+    def test_missing_and_traversal_are_404(self):
+        for path in ('missing.bin', '../etc/passwd', ''):
+            with self.assertRaises(Http404):
+                self.get(path)
+
+
+class TestCacheTest(SimpleTestCase):
+    def test_tests_do_not_touch_shared_cache(self):
+        location = settings.CACHES['default']['LOCATION']
+        self.assertNotEqual(os.path.dirname(location), settings.BASE_DIR)
+        self.assertTrue(location.startswith(tempfile.gettempdir()))
+
+
+class SQLiteTuningTest(SimpleTestCase):
+    writers = 8
+    readers = 4
+    rows_per_writer = 50
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_dict = dict(
+            connections[DEFAULT_DB_ALIAS].settings_dict,
+            NAME=os.path.join(self.tmp.name, 'stress.sqlite3'),
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def connect(self):
+        wrapper_class = type(connections[DEFAULT_DB_ALIAS])
+        return wrapper_class(self.settings_dict, alias='stress')
+
+    def test_new_connections_are_tuned(self):
+        connection = self.connect()
+        try:
+            values = db.pragmas(connection)
+        finally:
+            connection.close()
+        self.assertEqual(values['journal_mode'], 'wal')
+        self.assertEqual(values['synchronous'], 1)
+        self.assertEqual(values['busy_timeout'], 5000)
+        self.assertEqual(values['cache_size'], -64 * 1024)
+
+    def test_concurrent_writers_and_readers(self):
+        connection = self.connect()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (writer INTEGER, n INTEGER)')
+            cursor.execute('CREATE TABLE total (value INTEGER)')
+            cursor.execute('INSERT INTO total VALUES (0)')
+        connection.close()
+
+        errors = []
+        writing = threading.Event()
+        writing.set()
+
+        def write(number):
+            connection = self.connect()
+            try:
+                with connection.cursor() as cursor:
+                    for n in range(self.rows_per_writer):
+                        cursor.execute('BEGIN IMMEDIATE')
+                        cursor.execute('INSERT INTO item VALUES (%s, %s)',
+                                       [number, n])
+                        cursor.execute('UPDATE total SET value = value + 1')
+                        cursor.execute('COMMIT')
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        def read():
+            connection = self.connect()
+            try:
+                with connection.cursor() as cursor:
+                    while writing.is_set():
+                        cursor.execute('SELECT COUNT(*) FROM item')
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        readers = [threading.Thread(target=read)
+                   for _ in range(self.readers)]
+        writers = [threading.Thread(target=write, args=[number])
+                   for number in range(self.writers)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        writing.clear()
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        connection = self.connect()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*), (SELECT value FROM total) '
+                               'FROM item')
+                rows, total = cursor.fetchone()
+        finally:
+            connection.close()
+        expected = self.writers * self.rows_per_writer
+        self.assertEqual((rows, total), (expected, expected))
+
+
+@override_settings(DATABASE_REPLICA_APPS=['posts'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = db.ReplicaRouter()
+
+    def test_feed_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Post), db.REPLICA_DB_ALIAS)
+        self.assertIsNone(self.router.db_for_read(get_user_model()))
+        self.assertEqual(self.router.db_for_write(Post), DEFAULT_DB_ALIAS)
+        self.assertFalse(self.router.allow_migrate(db.REPLICA_DB_ALIAS,
+                                                   'posts'))
+
+    def test_reads_inside_transaction_stay_on_primary(self):
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS],
+                               'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.html = ('<p>Пост</p>' * 100).encode()
+
+    def process(self, response, accept='gzip, deflate'):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING=accept)
+        middleware = compression.CompressionMiddleware(lambda r: response)
+        return middleware(request)
+
+    def test_gzip(self):
+        response = HttpResponse(self.html)
+        response['ETag'] = '"page"'
+        response = self.process(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"page"')
+        self.assertEqual(int(response['Content-Length']),
+                         len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.html)
+
+    def test_skipped_responses(self):
+        for response, accept in (
+                (HttpResponse(b'<p>short</p>'), 'gzip'),
+                (HttpResponse(self.html), 'gzip;q=0, identity'),
+                (HttpResponse(self.html, content_type='image/png'), 'gzip'),
+                (FileResponse(iter([self.html]), content_type='text/css'),
+                 'gzip')):
+            response = self.process(response, accept)
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_is_flushed_per_chunk(self):
+        chunks = [b'<head></head>', self.html, b'</html>']
+        response = self.process(StreamingHttpResponse(iter(chunks)))
+        compressed = list(response.streaming_content)
+        self.assertGreaterEqual(len(compressed), len(chunks))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Первая часть читается до того, как пришли остальные.
+        self.assertEqual(decompressor.decompress(compressed[0]), chunks[0])
+        self.assertEqual(gzip.decompress(b''.join(compressed)),
+                         b''.join(chunks))
+
+    @skipIf(compression.brotli is None, 'пакет brotli не установлен')
+    def test_brotli_preferred(self):
+        response = self.process(HttpResponse(self.html), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content),
+                         self.html)
+
+    def test_brotli_needs_package(self):
+        with mock.patch.object(compression, 'brotli', None):
+            response = self.process(HttpResponse(self.html), 'br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class WarmupTest(TestCase):
+    def setUp(self):
+        self.addCleanup(templates.reset)
+        templates.reset()
+        author = get_user_model().objects.create_user(username='warm')
+        Post.objects.create(author=author, text='Прогрев')
+
+    def test_modes(self):
+        self.assertEqual(warmup.run('off'), {})
+        self.assertEqual(list(warmup.run('preload')),
+                         list(warmup.MODES['preload']))
+
+    def test_full_warmup_renders_pages(self):
+        engine = Engine.get_default()
+        with self.assertLogs('yatube.warmup', 'INFO') as logs:
+            timings = warmup.run('full')
+        self.assertEqual(list(timings), list(warmup.STEPS))
+        self.assertEqual([record.levelname for record in logs.records],
+                         ['INFO'])
+        self.assertIs(engine.get_template('index.html'),
+                      engine.get_template('index.html'))
+        # Синтетические запросы не попадают в метрики.
+        self.assertNotIn('view="index"', metrics.render())
+
+    def test_failed_step_does_not_stop_boot(self):
+        with mock.patch.dict(warmup.STEPS, urls=mock.Mock(
+                side_effect=RuntimeError('boom'))):
+            with self.assertLogs('yatube.warmup', 'ERROR'):
+                timings = warmup.run('preload')
+        self.assertIn('templates', timings)
+
+    def test_boot_report(self):
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, 'дольше бюджета'):
+            call_command('boot_report', '--warmup', 'off', '--budget-ms', '0',
+                         stdout=out)
+        self.assertIn('yatube.wsgi', out.getvalue())
+
+    def test_parse_importtime(self):
+        imports = warmup.parse_importtime([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       150 |        150 |     django.utils',
+            'import time:      2000 |       2150 |   django',
+            'import time:       500 |        500 |   posts.models',
+            'Traceback: не строка importtime',
+        ])
+        self.assertEqual(imports[0], warmup.ImportTime(
+            'django.utils', 1, 0.15, 0.15))
+        self.assertEqual(imports[1].depth, 0)
+        self.assertEqual(warmup.by_package(imports),
+                         {'django': 2.15, 'posts': 0.5})
@@ -4,7 +4,7 @@ from django.contrib import admin
 from django.contrib.flatpages import views
 from django.urls import include, path, re_path
 
-from django.views.static import serve
+from yatube.media import serve
 
 handler404 = "posts.views.page_not_found" # noqa
 handler500 = "posts.views.server_error" # noqa
@@ -14,12 +14,16 @@ urlpatterns = [
     path('about/', include('django.contrib.flatpages.urls')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('metrics/', include('perf.urls')),
+    path('api/v1/', include('posts.api_urls')),
     path('', include('posts.urls')),
 
     re_path(r'^media/(?P<path>.*)$',
-            serve, {'document_root': settings.MEDIA_ROOT}),
+            serve, {'document_root': settings.MEDIA_ROOT,
+                    'accel_prefix': '/internal/media/'}),
     re_path(r'^static/(?P<path>.*)$',
-            serve, {'document_root': settings.STATIC_ROOT}),
+            serve, {'document_root': settings.STATIC_ROOT,
+                    'accel_prefix': '/internal/static/'}),
 ]
 urlpatterns += [
         path('about-us/', views.flatpage,
@@ -0,0 +1,189 @@
+"""
+Прогрев воркера при старте (yatube.wsgi).
+
+Без прогрева первые запросы каждого воркера компилируют URLconf
+и шаблоны, заполняют кэши метаданных моделей, создают объекты sorl
+и открывают подключение к базе. Режим WARMUP:
+
+    off      — быстрый старт, всё это делают первые запросы;
+    preload  — шаги без ввода-вывода: URLconf, шаблоны, модели, sorl
+               (по умолчанию);
+    full     — ещё подключение к базе и синтетические запросы к index
+               и profile (WARMUP_REQUESTS раз каждый). Только явно:
+               запросы идут при каждом старте каждого воркера.
+
+Ошибка шага только пишется в лог: воркер стартует и без прогрева.
+Прогрев безопасен и в мастер-процессе preforking-сервера (gunicorn
+--preload): перед fork подключения к базе закрываются, и воркеры
+открывают свои.
+
+measure_boot() запускает импорт yatube.wsgi в отдельном процессе
+с -X importtime и возвращает время импорта каждого модуля и шагов
+прогрева (команда boot_report).
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver, reverse
+from perf import metrics, templates
+from posts.models import Post
+from sorl.thumbnail import default
+
+logger = logging.getLogger(__name__)
+
+
+def load_urls():
+    # reverse_dict заполняет все таблицы резолвера.
+    get_resolver().reverse_dict
+
+
+def load_templates():
+    if settings.TEMPLATE_PRELOAD:
+        for name, error in templates.preload()[1]:
+            logger.error('Шаблон %s: %r', name, error)
+
+
+def load_models():
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+
+def load_thumbnails():
+    # LazyObject создаёт бэкенд, хранилище и движок (PIL) при обращении.
+    for lazy in (default.backend, default.kvstore, default.engine,
+                 default.storage):
+        lazy.__class__
+
+
+def connect_databases():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def synthetic_requests():
+    paths = [reverse('index')]
+    author = (Post.objects.order_by('-pub_date')
+              .values_list('author__username', flat=True).first())
+    if author is not None:
+        paths.append(reverse('profile', args=[author]))
+    # django.test нужен только этому шагу: в preload его не импортируем.
+    from django.test import Client
+    client = Client()
+    for path in paths:
+        for _ in range(settings.WARMUP_REQUESTS):
+            response = client.get(path)
+            if response.status_code >= 500:
+                logger.error('Прогрев: %s ответил %s', path,
+                             response.status_code)
+    # В /metrics/ попадают только настоящие запросы.
+    metrics.reset()
+
+
+def close_connections():
+    # Подключение SQLite нельзя переносить через fork. Открытые
+    # транзакции не трогаем: их процесс ещё работает с базой.
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+os.register_at_fork(before=close_connections)
+
+STEPS = {
+    'urls': load_urls,
+    'templates': load_templates,
+    'models': load_models,
+    'thumbnails': load_thumbnails,
+    'database': connect_databases,
+    'requests': synthetic_requests,
+}
+MODES = {
+    'off': (),
+    'preload': ('urls', 'templates', 'models', 'thumbnails'),
+    'full': tuple(STEPS),
+}
+
+
+def run(mode=None):
+    """Выполняет шаги режима и возвращает {шаг: миллисекунды}."""
+    mode = settings.WARMUP if mode is None else mode
+    timings = {}
+    for step in MODES[mode]:
+        started = time.perf_counter()
+        try:
+            STEPS[step]()
+        except Exception:
+            logger.exception('Прогрев: шаг %s не удался', step)
+        timings[step] = round((time.perf_counter() - started) * 1000, 1)
+    if timings:
+        logger.info('Прогрев %s: %s', mode, timings)
+    return timings
+
+
+ImportTime = namedtuple('ImportTime', 'name depth self_ms cumulative_ms')
+
+BOOT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import yatube.wsgi
+print(json.dumps({
+    'boot_ms': (time.perf_counter() - started) * 1000,
+    'warmup_ms': yatube.wsgi.warmup_timings,
+}))
+"""
+
+
+def parse_importtime(lines):
+    """Строки вывода -X importtime -> [ImportTime] в порядке импорта."""
+    imports = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # заголовок
+        # Вложенность видна по отступу имени: два пробела на уровень.
+        depth = (len(name) - len(name.lstrip())) // 2 - 1
+        imports.append(ImportTime(name.strip(), depth,
+                                  int(self_us) / 1000,
+                                  int(cumulative_us) / 1000))
+    return imports
+
+
+def by_package(imports):
+    """Собственное время импорта по пакетам верхнего уровня, мс."""
+    totals = Counter()
+    for item in imports:
+        totals[item.name.split('.')[0]] += item.self_ms
+    return totals
+
+
+def measure_boot(mode):
+    """
+    Импортирует yatube.wsgi в новом процессе с WARMUP=mode. Возвращает
+    (время старта мс, {шаг прогрева: мс}, [ImportTime]).
+    """
+    env = dict(os.environ, YATUBE_WARMUP=mode)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        check=True,
+    )
+    boot = json.loads(result.stdout.strip().splitlines()[-1])
+    # Прогрев идёт внутри импорта yatube.wsgi: его время не импорт.
+    warmup_ms = sum(boot['warmup_ms'].values())
+    imports = [
+        item._replace(self_ms=item.self_ms - warmup_ms)
+        if item.name == 'yatube.wsgi' else item
+        for item in parse_importtime(result.stderr.splitlines())
+    ]
+    return boot['boot_ms'], boot['warmup_ms'], imports
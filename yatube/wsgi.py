@@ -10,3 +10,9 @@ application = get_wsgi_application()
 # application = WhiteNoise(application, root='/path/to/static/files')
 # application.add_files('/path/to/more/static/files', prefix='more-files/')
 # application = WhiteNoise(application)
+
+# Первые запросы воркера не платят за компиляцию URLconf и шаблонов:
+# режим задаёт WARMUP.
+from yatube import warmup  # noqa: E402
+
+warmup_timings = warmup.run()